@@ -0,0 +1,214 @@
+import numpy as np
+
+# Vectorized evaluation of the PlantFinance fixed-charge-rate LCOE model over
+# many cases at once.  This is the NumPy reference of the model equations;
+# the fused kernel in kernels.py falls back to it when numba is not installed,
+# and PlantFinance evaluates its single point with kernels.ScalarEvaluator.
+
+INPUT_NAMES = ('machine_rating', 'tcc_per_kW', 'turbine_number', 'bos_per_kW', 'opex_per_kW',
+               'park_aep', 'turbine_aep', 'wake_loss_factor', 'fixed_charge_rate')
+
+DEFAULTS = {'park_aep'          : 0.0,
+            'turbine_aep'       : 0.0,
+            'bos_per_kW'        : 0.0,
+            'opex_per_kW'       : 0.0,
+            'wake_loss_factor'  : 0.15,
+            'fixed_charge_rate' : 0.079216644}
+
+INTERMEDIATE_NAMES = ('c_turbine', 'c_bos_turbine', 'c_opex_turbine', 'park_aep', 'npr', 'nec',
+                      'icc', 'c_opex', 'capital_cost')
+
+# Same keys as PlantFinance.J
+JACOBIAN_KEYS = (('lcoe', 'turbine_cost'),
+                 ('lcoe', 'turbine_number'),
+                 ('lcoe', 'turbine_bos_costs'),
+                 ('lcoe', 'turbine_avg_annual_opex'),
+                 ('lcoe', 'fixed_charge_rate'),
+                 ('lcoe', 'wake_loss_factor'),
+                 ('lcoe', 'turbine_aep'),
+                 ('lcoe', 'park_aep'),
+                 ('lcoe', 'machine_rating'))
+
+# Relative error bound of the float32 path against the float64 reference.  With
+# u = 2**-24 the unit roundoff of float32, every output carries at most ~10
+# roundings of the inputs and ~20 of the arithmetic, so 32*u (~1.9e-6) holds
+# for lcoe, the intermediates and the Jacobian entries, measured relative to
+# |y64|.  The turbine_number and machine_rating entries are differences of
+# nearly equal terms (they are analytically zero when park_aep is derived from
+# turbine_aep) and are accumulated in float64; their bound is relative to the
+# size of the terms, |lcoe/turbine_number| and |lcoe/machine_rating|.
+FLOAT32_RTOL = 32 * 2.0**-24
+
+
+def as_columns(inputs, dtype=np.float64):
+    """Return a dict of broadcast 1-D input columns, filling in defaults."""
+    cols = {}
+    for name in INPUT_NAMES:
+        if name in inputs:
+            cols[name] = np.asarray(inputs[name], dtype=dtype)
+        elif name in DEFAULTS:
+            cols[name] = np.asarray(DEFAULTS[name], dtype=dtype)
+        else:
+            raise KeyError('Plant_FinanceSE batch input "%s" is required' % name)
+    arrays = np.broadcast_arrays(*[cols[name] for name in INPUT_NAMES])
+    return dict((name, np.atleast_1d(a)) for name, a in zip(INPUT_NAMES, arrays))
+
+
+def check_inputs(cols):
+    """Vectorized version of the input checks in PlantFinance.solve_nonlinear."""
+    bad = cols['turbine_number'] == 0
+    if np.any(bad):
+        raise ValueError('ERROR: turbine_number is 0 for %d case(s). Check the connections to Plant_FinanceSE' % np.count_nonzero(bad))
+    bad = cols['tcc_per_kW'] * cols['machine_rating'] == 0
+    if np.any(bad):
+        raise ValueError('ERROR: The cost of the turbines is 0 USD for %d case(s). Check the connections to Plant_FinanceSE' % np.count_nonzero(bad))
+    bad = (cols['park_aep'] == 0) & (cols['turbine_aep'] == 0)
+    if np.any(bad):
+        raise ValueError('ERROR: Both turbine_aep and park_aep are 0 Wh for %d case(s). Check the connections to Plant_FinanceSE' % np.count_nonzero(bad))
+
+
+# Cases per block in which the float32 path evaluates its float64 partials
+CHUNK = 65536
+
+
+def _cancelling_partials(cols, d_nturb, d_trating):
+    """The turbine_number and machine_rating partials of lcoe, computed in float64.
+
+    Both are differences of two terms of the same size that cancel exactly for
+    the usual inputs, so evaluating them in float32 would return pure rounding
+    noise.  They are written into d_nturb and d_trating block by block, so the
+    float64 temporaries stay CHUNK cases long whatever the batch size.
+    """
+    for start in range(0, d_nturb.shape[0], CHUNK):
+        s = slice(start, start + CHUNK)
+        t_rating  = cols['machine_rating'][s].astype(np.float64)
+        n_turbine = cols['turbine_number'][s].astype(np.float64)
+        wlf       = cols['wake_loss_factor'][s].astype(np.float64)
+        fcr       = cols['fixed_charge_rate'][s].astype(np.float64)
+        opex      = cols['opex_per_kW'][s].astype(np.float64)
+        turb_aep  = cols['turbine_aep'][s].astype(np.float64)
+        use_turb  = cols['park_aep'][s] == 0
+        park_aep  = np.where(use_turb, n_turbine * turb_aep * (1. - wlf), cols['park_aep'][s])
+        npr  = n_turbine * t_rating
+        nec  = park_aep / npr
+        icc  = cols['tcc_per_kW'][s].astype(np.float64) + cols['bos_per_kW'][s]
+        lcoe = (icc * fcr + opex) / nec
+
+        dpark_dnturb  = np.where(use_turb, turb_aep * (1. - wlf), 0.0)
+        dnec_dnturb   = dpark_dnturb / npr - t_rating  * nec / npr
+        dnec_dtrating =                    - n_turbine * nec / npr
+        d_nturb[s]   = -dnec_dnturb * lcoe / nec
+        d_trating[s] = (-icc / t_rating * fcr - opex / t_rating) / nec - dnec_dtrating * lcoe / nec
+
+
+def evaluate(inputs, jacobian=True, intermediates=False, check=True, dtype=np.float64, lcoe=None):
+    """Evaluate LCOE for a batch of cases.
+
+    inputs is a mapping from the PlantFinance param names to scalars or arrays,
+    which are broadcast against each other.  Returns a dict with 'lcoe' and,
+    on request, the intermediates and the PlantFinance Jacobian entries (keyed
+    as in PlantFinance.J).
+
+    dtype=np.float32 stores and computes everything in single precision except
+    the two cancellation-prone Jacobian entries, see FLOAT32_RTOL.  lcoe, if
+    the lcoe of these cases is already known, is used as is instead of being
+    recomputed.
+    """
+    dtype = np.dtype(dtype)
+    cols = as_columns(inputs, dtype=dtype)
+    if check:
+        check_inputs(cols)
+
+    t_rating    = cols['machine_rating']
+    n_turbine   = cols['turbine_number']
+    fcr         = cols['fixed_charge_rate']
+    wlf         = cols['wake_loss_factor']
+    turb_aep    = cols['turbine_aep']
+
+    c_turbine       = cols['tcc_per_kW']  * t_rating
+    c_bos_turbine   = cols['bos_per_kW']  * t_rating
+    c_opex_turbine  = cols['opex_per_kW'] * t_rating
+
+    use_turb    = cols['park_aep'] == 0
+    park_aep    = np.where(use_turb, n_turbine * turb_aep * (1. - wlf), cols['park_aep'])
+
+    npr = n_turbine * t_rating
+    nec = park_aep / npr
+
+    icc     = (c_turbine + c_bos_turbine) / t_rating
+    c_opex  = c_opex_turbine / t_rating
+
+    if lcoe is None:
+        lcoe = (icc * fcr + c_opex) / nec
+    else:
+        lcoe = np.broadcast_to(np.asarray(lcoe, dtype=dtype), t_rating.shape)
+
+    out = {'lcoe': lcoe}
+    if intermediates:
+        out['c_turbine']        = c_turbine
+        out['c_bos_turbine']    = c_bos_turbine
+        out['c_opex_turbine']   = c_opex_turbine
+        out['park_aep']         = park_aep
+        out['npr']              = npr
+        out['nec']              = nec
+        out['icc']              = icc
+        out['c_opex']           = c_opex
+        out['capital_cost']     = icc * n_turbine * t_rating
+
+    if jacobian:
+        zero = np.zeros_like(lcoe)
+        dpark_dtaep  = np.where(use_turb, n_turbine * (1. - wlf), zero)
+        dpark_dwlf   = np.where(use_turb, -n_turbine * turb_aep,  zero)
+        dpark_dpaep  = np.where(use_turb, zero, 1.0)
+
+        dnec_dwlf     = dpark_dwlf   / npr
+        dnec_dtaep    = dpark_dtaep  / npr
+        dnec_dpaep    = dpark_dpaep  / npr
+        dicc_dcturb   = 1.0 / t_rating
+
+        out['lcoe', 'turbine_cost'           ] = dicc_dcturb * fcr / nec
+        out['lcoe', 'turbine_bos_costs'      ] = dicc_dcturb * fcr / nec
+        out['lcoe', 'turbine_avg_annual_opex'] = dicc_dcturb / nec
+        out['lcoe', 'fixed_charge_rate'      ] = icc / nec
+        out['lcoe', 'wake_loss_factor'       ] = -dnec_dwlf  * lcoe / nec
+        out['lcoe', 'turbine_aep'            ] = -dnec_dtaep * lcoe / nec
+        out['lcoe', 'park_aep'               ] = -dnec_dpaep * lcoe / nec
+
+        if dtype == np.float64:
+            dpark_dnturb  = np.where(use_turb, turb_aep * (1. - wlf), zero)
+            dnec_dnturb   = dpark_dnturb / npr - t_rating  * nec / npr
+            dnec_dtrating =                    - n_turbine * nec / npr
+            dicc_dtrating   = -icc / t_rating
+            dcopex_dtrating = -c_opex / t_rating
+            out['lcoe', 'turbine_number'] = -dnec_dnturb * lcoe / nec
+            out['lcoe', 'machine_rating'] = (dicc_dtrating * fcr + dcopex_dtrating) / nec - dnec_dtrating * lcoe / nec
+        else:
+            out['lcoe', 'turbine_number'] = np.empty_like(lcoe)
+            out['lcoe', 'machine_rating'] = np.empty_like(lcoe)
+            _cancelling_partials(cols, out['lcoe', 'turbine_number'], out['lcoe', 'machine_rating'])
+
+    return out
+
+
+def input_gradients(cols, out):
+    """Total derivatives of lcoe with respect to the batch inputs.
+
+    The PlantFinance Jacobian is taken with respect to the per-turbine costs;
+    this applies the chain rule through c_turbine = tcc_per_kW * machine_rating
+    (and likewise for BoS and opex) to get gradients with respect to the
+    INPUT_NAMES themselves.  cols are the inputs as returned by as_columns and
+    out a batch.evaluate result with the Jacobian.
+    """
+    t_rating = cols['machine_rating']
+    d_cturb  = out['lcoe', 'turbine_cost']
+    d_cbos   = out['lcoe', 'turbine_bos_costs']
+    d_copex  = out['lcoe', 'turbine_avg_annual_opex']
+    return {'machine_rating'    : out['lcoe', 'machine_rating'] + d_cturb * cols['tcc_per_kW'] + d_cbos * cols['bos_per_kW'] + d_copex * cols['opex_per_kW'],
+            'tcc_per_kW'        : d_cturb * t_rating,
+            'bos_per_kW'        : d_cbos  * t_rating,
+            'opex_per_kW'       : d_copex * t_rating,
+            'turbine_number'    : out['lcoe', 'turbine_number'],
+            'park_aep'          : out['lcoe', 'park_aep'],
+            'turbine_aep'       : out['lcoe', 'turbine_aep'],
+            'wake_loss_factor'  : out['lcoe', 'wake_loss_factor'],
+            'fixed_charge_rate' : out['lcoe', 'fixed_charge_rate']}
@@ -0,0 +1,157 @@
+import asyncio
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from plant_financese import batch, kernels, service
+
+# Micro-benchmarks for the batch evaluation paths.  Run as
+#     python -m plant_financese.bench [name ...]
+
+
+def random_cases(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {'machine_rating'    : rng.uniform(1500., 5000., n),
+            'tcc_per_kW'        : rng.uniform(900., 1300., n),
+            'turbine_number'    : rng.integers(10, 200, n).astype(float),
+            'bos_per_kW'        : rng.uniform(300., 700., n),
+            'opex_per_kW'       : rng.uniform(30., 60., n),
+            'turbine_aep'       : rng.uniform(5e6, 2e7, n),
+            'wake_loss_factor'  : rng.uniform(0.05, 0.2, n),
+            'fixed_charge_rate' : rng.uniform(0.05, 0.12, n)}
+
+
+def best_time(fn, repeat=5):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_alloc(fn):
+    """Peak bytes allocated by fn, NumPy buffers included."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def nbytes(out):
+    return sum(v.nbytes for v in out.values())
+
+
+def bench_precision(n=2000000):
+    cases = random_cases(n)
+    print('Batch LCOE + Jacobian, %d cases' % n)
+    print('%-10s %14s %14s %14s %18s' % ('dtype', 'Mcases/s', 'inputs [MB]', 'outputs [MB]', 'peak alloc [MB]'))
+    for dtype in (np.float64, np.float32):
+        cols = batch.as_columns(cases, dtype=dtype)
+        t    = best_time(lambda: batch.evaluate(cols, dtype=dtype))
+        out  = batch.evaluate(cols, dtype=dtype)
+        peak = peak_alloc(lambda: batch.evaluate(cols, dtype=dtype))
+        print('%-10s %14.2f %14.1f %14.1f %18.1f' % (np.dtype(dtype).name, n / t * 1.e-006, nbytes(cols) * 1.e-006,
+                                                     nbytes(out) * 1.e-006, peak * 1.e-006))
+
+
+def bench_kernels(n=2000000):
+    cols = kernels.input_columns(random_cases(n))
+    out  = kernels.Outputs(n)
+    print('Fused kernel vs NumPy path, LCOE + Jacobian, %d cases (%s)' % (n, 'numba available' if kernels.HAVE_NUMBA else 'numba not installed'))
+    print('%-16s %12s %12s %22s' % ('path', 'Mcases/s', 'speedup', 'allocated [MB]'))
+    runs = [('batch.evaluate', lambda: batch.evaluate(cols, check=False)),
+            ('kernels numpy',  lambda: kernels.evaluate(cols, out=out, check=False, backend='numpy'))]
+    if kernels.HAVE_NUMBA:
+        kernels.evaluate(cols, out=out, check=False, backend='numba') # compile
+        runs.append(('kernels numba', lambda: kernels.evaluate(cols, out=out, check=False, backend='numba')))
+    t_ref = None
+    for name, fn in runs:
+        t = best_time(fn)
+        t_ref = t if t_ref is None else t_ref
+        print('%-16s %12.2f %12.2f %22.1f' % (name, n / t * 1.e-006, t_ref / t, peak_alloc(fn) * 1.e-006))
+
+
+def bench_service(n=20000):
+    cols  = random_cases(n)
+    cases = [dict((k, float(v[i])) for k, v in cols.items()) for i in range(n)]
+    print('Concurrent single-case queries, %d requests' % n)
+    t0 = time.perf_counter()
+    for case in cases:
+        batch.evaluate(case, jacobian=False)
+    t_single = time.perf_counter() - t0
+    print('%-28s %12.0f req/s' % ('one batch.evaluate per case', n / t_single))
+
+    async def run():
+        ev = service.Evaluator(max_batch=1024, max_delay=0.002)
+        await asyncio.gather(*[ev.submit(case) for case in cases])
+        await ev.stop()
+        return ev.metrics.snapshot()
+    m = asyncio.run(run())
+    print('%-28s %12.0f req/s   p50 %.1f ms   p99 %.1f ms   mean batch %.0f'
+          % ('service.Evaluator', m['throughput_rps'], m['p50_ms'], m['p99_ms'], m['mean_batch_size']))
+
+
+def bench_lazy(n=2000000):
+    cases = random_cases(n)
+    print('Primal-only vs eager evaluation, %d cases' % n)
+    print('%-10s %18s %18s %10s' % ('backend', 'lcoe only [s]', 'lcoe + J [s]', 'speedup'))
+    backends = ['numpy'] + (['numba'] if kernels.HAVE_NUMBA else [])
+    for backend in backends:
+        lazy = kernels.LazyEvaluator(n, check=False, backend=backend)
+        lazy.set_inputs(cases)
+        lazy.jacobian() # compile
+
+        def primal():
+            lazy.invalidate()
+            lazy.lcoe
+
+        def eager():
+            # one pass filling lcoe and the Jacobian, as before the evaluation was made lazy
+            lazy.invalidate()
+            lazy.jacobian()
+        t_primal, t_eager = best_time(primal), best_time(eager)
+        print('%-10s %18.4f %18.4f %10.2f' % (backend, t_primal, t_eager, t_eager / t_primal))
+
+
+def bench_point(n=20000):
+    case = dict((k, float(v[0])) for k, v in random_cases(1).items())
+    case['park_aep'] = 0.0
+    x = [case[name] for name in batch.INPUT_NAMES]
+    print('Single-point lcoe + Jacobian at a new point, as in PlantFinance solve_nonlinear + linearize')
+    print('%-28s %12s' % ('path', 'us/point'))
+    scalar = kernels.ScalarEvaluator()
+    lazy = kernels.LazyEvaluator(1, check=False)
+
+    def run_scalar():
+        for i in range(n):
+            x[0] = 2000. + i
+            scalar.set_inputs(x)
+            scalar.lcoe
+            scalar.jacobian()
+
+    def run_lazy():
+        for i in range(n):
+            case['machine_rating'] = 2000. + i
+            lazy.set_inputs(case)
+            lazy.lcoe
+            lazy.jacobian()
+    run_lazy() # compile
+    for name, fn in [('kernels.ScalarEvaluator', run_scalar), ('kernels.LazyEvaluator(1)', run_lazy)]:
+        print('%-28s %12.2f' % (name, best_time(fn, repeat=3) / n * 1.e006))
+
+
+BENCHMARKS = {'precision': bench_precision,
+              'kernels'  : bench_kernels,
+              'lazy'     : bench_lazy,
+              'point'    : bench_point,
+              'service'  : bench_service}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
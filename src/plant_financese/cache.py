@@ -0,0 +1,188 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from plant_financese import batch
+
+# Persistent, content-addressed cache of PlantFinance evaluations.
+#
+# Every case is keyed by a hash of its nine float64 inputs.  The stored value
+# holds lcoe, the intermediates and the Jacobian, in the order of VALUE_NAMES.
+# Entries are tagged with MODEL_VERSION, a hash of the model source, so any
+# change to the finance formulation invalidates the cache the next time it is
+# opened.  The store is an SQLite database in WAL mode, which lets any number
+# of processes read and write it concurrently; each process opens its own
+# connection on first use.  Lookups only read: the access times used for LRU
+# eviction are collected in memory and written with the next store (or every
+# touch_batch hits), and the number of entries is kept in the meta table, so
+# neither a hit nor a store scans or locks the whole table.
+
+VALUE_NAMES = ('lcoe',) + batch.INTERMEDIATE_NAMES + batch.JACOBIAN_KEYS
+
+
+def model_version():
+    """Hash of the source of the model equations."""
+    with open(batch.__file__.replace('.pyc', '.py'), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+MODEL_VERSION = model_version()
+
+
+def case_keys(cols):
+    """16-byte content hash of every case in cols (see batch.as_columns)."""
+    table = np.ascontiguousarray(np.column_stack([cols[name] for name in batch.INPUT_NAMES]), dtype=np.float64)
+    # -0.0 and 0.0 are the same case
+    table += 0.0
+    return [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in table]
+
+
+class EvaluationCache(object):
+    """Size-bounded on-disk cache in front of batch.evaluate.
+
+    max_entries bounds the number of stored cases; when it is exceeded the
+    least recently used entries are evicted down to evict_to * max_entries.
+    Access times of hits are held in memory and written with the next store,
+    on close or once touch_batch of them are pending, so recency is only as
+    current as the last write of each process.
+    Close the cache (or use it as a context manager) before its file is
+    deleted, as SQLite requires.
+    """
+    def __init__(self, path, max_entries=1000000, evict_to=0.9, version=MODEL_VERSION, timeout=60.0, touch_batch=4096):
+        self.path        = path
+        self.max_entries = max_entries
+        self.evict_to    = evict_to
+        self.version     = version
+        self.timeout     = timeout
+        self.touch_batch = touch_batch
+        self.hits        = 0
+        self.misses      = 0
+        self._conn       = None
+        self._pid        = None
+        self._touched    = {}       # key -> access time not yet written
+        self.connection()
+
+    def connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value BLOB NOT NULL, accessed REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            meta = dict(conn.execute('SELECT name, value FROM meta'))
+            if meta.get('version') != self.version or 'count' not in meta:
+                self._setup(conn)
+            self._conn, self._pid, self._touched = conn, os.getpid(), {}
+        return self._conn
+
+    def _setup(self, conn):
+        with _transaction(conn):
+            row = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != self.version:
+                # the finance formulation changed: nothing stored is valid anymore
+                conn.execute('DELETE FROM cache')
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('count', '0')")
+            elif conn.execute("SELECT value FROM meta WHERE name = 'count'").fetchone() is None:
+                conn.execute("INSERT INTO meta SELECT 'count', COUNT(*) FROM cache")
+
+    def __len__(self):
+        return int(self.connection().execute("SELECT value FROM meta WHERE name = 'count'").fetchone()[0])
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            if self._touched:
+                with _transaction(self._conn):
+                    self._write_touched(self._conn)
+            self._conn.close()
+        self._conn = None
+
+    def _write_touched(self, conn):
+        conn.executemany('UPDATE cache SET accessed = ? WHERE key = ?', [(t, k) for k, t in self._touched.items()])
+        self._touched = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def lookup(self, keys):
+        """Return {key: value array} for the keys found in the cache."""
+        conn = self.connection()
+        found = {}
+        unique = list(set(keys))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            for key, value in conn.execute('SELECT key, value FROM cache WHERE key IN (%s)' % marks, chunk):
+                found[bytes(key)] = np.frombuffer(value, dtype=np.float64)
+        now = time.time()
+        for key in found:
+            self._touched[key] = now
+        if len(self._touched) >= self.touch_batch:
+            with _transaction(conn):
+                self._write_touched(conn)
+        return found
+
+    def store(self, keys, values):
+        """Store the rows of values, shape (len(keys), len(VALUE_NAMES))."""
+        conn = self.connection()
+        now = time.time()
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        with _transaction(conn):
+            self._write_touched(conn)
+            # values are a function of the key, so an entry stored meanwhile by another process is kept
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+                             [(k, v.tobytes(), now) for k, v in zip(keys, values)])
+            count = int(conn.execute("SELECT value FROM meta WHERE name = 'count'").fetchone()[0])
+            count += conn.total_changes - before
+            if count > self.max_entries:
+                excess = count - int(self.evict_to * self.max_entries)
+                count -= conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                                      (excess,)).rowcount
+            conn.execute("UPDATE meta SET value = ? WHERE name = 'count'", (str(count),))
+
+    def evaluate(self, inputs):
+        """batch.evaluate(inputs, jacobian=True, intermediates=True) through the cache."""
+        cols = batch.as_columns(inputs)
+        keys = case_keys(cols)
+        found = self.lookup(keys)
+        values = np.empty((len(keys), len(VALUE_NAMES)))
+        missing = []
+        for i, key in enumerate(keys):
+            value = found.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                values[i] = value
+        self.hits   += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            index = np.array(missing)
+            out = batch.evaluate(dict((name, cols[name][index]) for name in batch.INPUT_NAMES),
+                                 jacobian=True, intermediates=True)
+            values[index] = np.column_stack([out[name] for name in VALUE_NAMES])
+            new = {}
+            for i in missing:
+                new[keys[i]] = values[i]
+            self.store(list(new), np.array(list(new.values())))
+
+        return dict((name, values[:, j]) for j, name in enumerate(VALUE_NAMES))
+
+
+class _transaction(object):
+    """BEGIN IMMEDIATE ... COMMIT on an autocommit connection, rolled back on errors."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
@@ -0,0 +1,213 @@
+import json
+import os
+import socket
+
+import numpy as np
+
+from plant_financese import batch
+
+# Chunked, reproducible execution of large PlantFinance sweeps.
+#
+# A sweep of n_cases is cut into fixed chunks of chunk_size cases.  Chunk i draws
+# its cases from its own RNG stream (SeedSequence(seed, spawn_key=(i,))), is
+# evaluated with the batch model and reduced to a small partial.  Partials are
+# combined in chunk order with compensated summation, so the result depends only
+# on (seed, n_cases, chunk_size) and never on the backend, the number of workers
+# or the order in which chunks complete.  With a checkpoint directory every
+# chunk is saved by the worker (or rank) that evaluated it as soon as it is
+# done, so a failure anywhere loses only the chunks still in flight.
+
+
+def chunk_bounds(n_cases, chunk_size):
+    """Return the list of (start, stop) case ranges for a sweep."""
+    if chunk_size <= 0:
+        raise ValueError('chunk_size must be positive')
+    return [(start, min(start + chunk_size, n_cases)) for start in range(0, n_cases, chunk_size)]
+
+
+def chunk_rng(seed, index):
+    """Independent random generator for chunk `index` of a sweep seeded with `seed`."""
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=(index,))))
+
+
+class KahanSum(object):
+    """Neumaier compensated accumulator for a stream of floats."""
+    def __init__(self):
+        self.total = 0.0
+        self.comp  = 0.0
+
+    def add(self, x):
+        x = float(x)
+        t = self.total + x
+        if abs(self.total) >= abs(x):
+            self.comp += (self.total - t) + x
+        else:
+            self.comp += (x - t) + self.total
+        self.total = t
+
+    @property
+    def value(self):
+        return self.total + self.comp
+
+
+def evaluate_chunk(task):
+    """Evaluate one chunk and reduce it to a partial.
+
+    task = (sample_fn, seed, index, start, stop, checkpoint); the partial is
+    saved to checkpoint, if not None, before it is returned.
+    """
+    sample_fn, seed, index, start, stop, checkpoint = task
+    inputs = sample_fn(chunk_rng(seed, index), stop - start)
+    out = batch.evaluate(inputs, jacobian=False, intermediates=True)
+    lcoe = out['lcoe']
+    # np.sum uses pairwise summation, which is deterministic for a given chunk
+    partial = {'count'       : int(lcoe.size),
+               'lcoe_sum'    : float(np.sum(lcoe)),
+               'capital_sum' : float(np.sum(out['capital_cost'])),
+               'lcoe_min'    : float(np.min(lcoe)),
+               'lcoe_max'    : float(np.max(lcoe))}
+    if checkpoint is not None:
+        checkpoint.save(index, partial)
+    return index, partial
+
+
+class SerialBackend(object):
+    """Evaluate chunks one after the other in the calling process."""
+    def map(self, fn, tasks):
+        for task in tasks:
+            yield fn(task)
+
+
+class ProcessPoolBackend(object):
+    """Evaluate chunks on a local process pool; results arrive in completion order."""
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    def map(self, fn, tasks):
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(fn, task) for task in tasks]
+            for f in as_completed(futures):
+                yield f.result()
+
+
+def _run_rank(args):
+    fn, tasks, rank, size = args
+    return [fn(task) for task in tasks[rank::size]]
+
+
+class MPIBackend(object):
+    """Static round-robin distribution of chunks over ranks, gathered on every rank.
+
+    With an mpi4py communicator each rank evaluates chunks rank, rank+size, ...
+    and the partials are allgathered.  With comm=None, `size` local processes
+    stand in for the ranks, which lets the same code path run without MPI.
+    Each rank checkpoints its own chunks as it completes them (see
+    evaluate_chunk), so nothing waits for the gather to reach the disk.
+    """
+    def __init__(self, comm=None, size=2):
+        self.comm = comm
+        self.size = comm.Get_size() if comm is not None else size
+
+    def map(self, fn, tasks):
+        tasks = list(tasks)
+        if self.comm is not None:
+            local = _run_rank((fn, tasks, self.comm.Get_rank(), self.size))
+            gathered = self.comm.allgather(local)
+        else:
+            from multiprocessing import Pool
+            with Pool(self.size) as pool:
+                gathered = list(pool.imap_unordered(_run_rank, [(fn, tasks, r, self.size) for r in range(self.size)]))
+        for local in gathered:
+            for result in local:
+                yield result
+
+
+class Checkpoint(object):
+    """Directory of completed chunk partials, one JSON file per chunk.
+
+    Files are written atomically, so a sweep killed at any point restarts by
+    re-evaluating only the chunks without a file.  Every chunk file has a
+    single writer, the worker that evaluated the chunk; the directory may be
+    shared by the nodes of a cluster.
+    """
+    def __init__(self, path, key):
+        self.path = path
+        self.key  = key
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        manifest = os.path.join(path, 'manifest.json')
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                if json.load(f) != key:
+                    raise ValueError('Checkpoint in %s belongs to a different sweep (%s)' % (path, key))
+        else:
+            self._write(manifest, key)
+
+    def _chunk_file(self, index):
+        return os.path.join(self.path, 'chunk_%08d.json' % index)
+
+    def _write(self, fname, data):
+        # unique across the nodes sharing the directory
+        tmp = fname + '.tmp-%s-%d' % (socket.gethostname(), os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, fname)
+
+    def load(self, index):
+        fname = self._chunk_file(index)
+        if not os.path.exists(fname):
+            return None
+        with open(fname) as f:
+            return json.load(f)
+
+    def save(self, index, partial):
+        self._write(self._chunk_file(index), partial)
+
+
+class SweepResult(object):
+    def __init__(self, partials):
+        lcoe_sum, capital_sum = KahanSum(), KahanSum()
+        self.count = 0
+        self.lcoe_min, self.lcoe_max = np.inf, -np.inf
+        for index in sorted(partials):
+            p = partials[index]
+            self.count += p['count']
+            lcoe_sum.add(p['lcoe_sum'])
+            capital_sum.add(p['capital_sum'])
+            self.lcoe_min = min(self.lcoe_min, p['lcoe_min'])
+            self.lcoe_max = max(self.lcoe_max, p['lcoe_max'])
+        self.n_chunks       = len(partials)
+        self.lcoe_sum       = lcoe_sum.value
+        self.capital_sum    = capital_sum.value
+        self.lcoe_mean      = self.lcoe_sum / self.count if self.count else np.nan
+        self.capital_mean   = self.capital_sum / self.count if self.count else np.nan
+
+
+def run_sweep(sample_fn, n_cases, chunk_size=100000, seed=0, backend=None, checkpoint_dir=None):
+    """Evaluate n_cases PlantFinance cases drawn by sample_fn and reduce them.
+
+    sample_fn(rng, n) must return a batch.evaluate input mapping for n cases and
+    be picklable (a module level function) for the process backends.  A
+    checkpoint is only reused by a sweep with the same sample_fn (by qualified
+    name), n_cases, chunk_size and seed.
+    """
+    backend = SerialBackend() if backend is None else backend
+    bounds  = chunk_bounds(n_cases, chunk_size)
+
+    checkpoint = None
+    partials   = {}
+    if checkpoint_dir is not None:
+        sampler = '%s.%s' % (sample_fn.__module__, getattr(sample_fn, '__qualname__', sample_fn.__name__))
+        checkpoint = Checkpoint(checkpoint_dir, {'sampler': sampler, 'n_cases': n_cases, 'chunk_size': chunk_size, 'seed': seed})
+        for index in range(len(bounds)):
+            p = checkpoint.load(index)
+            if p is not None:
+                partials[index] = p
+
+    tasks = [(sample_fn, seed, index, start, stop, checkpoint) for index, (start, stop) in enumerate(bounds)
+             if index not in partials]
+    for index, partial in backend.map(evaluate_chunk, tasks):
+        partials[index] = partial
+
+    return SweepResult(partials)
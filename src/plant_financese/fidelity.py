@@ -0,0 +1,183 @@
+import numpy as np
+
+from plant_financese import batch
+
+# Hierarchy of LCOE models of increasing fidelity behind one interface, and a
+# screening driver that evaluates a large case set with the cheapest model and
+# re-evaluates at higher fidelity only the cases close to a decision threshold.
+#
+#   level 0  FCRModel       fixed charge rate, exactly the PlantFinance model
+#   level 1  AnnuityModel   capital recovery factor with construction financing
+#   level 2  CashFlowModel  discounted year-by-year cash flows with taxes,
+#                           straight-line depreciation and energy degradation
+#
+# All models share the cost and energy inputs of PlantFinance (see
+# batch.INPUT_NAMES); the financial inputs of the higher levels default to
+# FINANCE_DEFAULTS.
+
+FINANCE_DEFAULTS = {'discount_rate'      : 0.07,
+                    'project_lifetime'   : 20.0,
+                    'construction_time'  : 1.0,
+                    'tax_rate'           : 0.0,
+                    'depreciation_years' : 5.0,
+                    'degradation'        : 0.0}
+
+
+def case_count(inputs):
+    """Number of cases in inputs, broadcasting the plant and finance inputs together."""
+    values = [batch.as_columns(inputs)['machine_rating']]
+    values += [np.asarray(inputs[name]) for name in FINANCE_DEFAULTS if name in inputs]
+    return np.broadcast(*values).shape[0]
+
+
+def finance_column(inputs, name, n):
+    return np.broadcast_to(np.asarray(inputs.get(name, FINANCE_DEFAULTS[name]), dtype=np.float64), (n,))
+
+
+def capital_recovery_factor(r, years):
+    """Annuity factor r/(1-(1+r)^-N), with the r -> 0 limit 1/N."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crf = r / (1. - (1. + r)**(-years))
+    return np.where(r == 0, 1. / years, crf)
+
+
+class FinanceModel(object):
+    """Common interface of the fidelity levels."""
+    level = None
+    name = None
+
+    def evaluate(self, inputs):
+        """Return the lcoe of every case in inputs (mapping of columns), in USD/kW/h."""
+        raise NotImplementedError
+
+    def plant(self, inputs):
+        out = batch.evaluate(inputs, jacobian=False, intermediates=True)
+        n = case_count(inputs)
+        return tuple(np.broadcast_to(out[key], (n,)) for key in ('lcoe', 'icc', 'c_opex', 'nec'))
+
+
+class FCRModel(FinanceModel):
+    level = 0
+    name = 'fixed charge rate'
+
+    def evaluate(self, inputs):
+        lcoe = batch.evaluate(inputs, jacobian=False)['lcoe']
+        n = case_count(inputs)
+        # the finance inputs do not enter this level, but they may set the number of cases
+        return lcoe if lcoe.shape[0] == n else np.repeat(lcoe, n)
+
+
+class AnnuityModel(FinanceModel):
+    level = 1
+    name = 'annuity with construction financing'
+
+    def evaluate(self, inputs):
+        _, icc, c_opex, nec = self.plant(inputs)
+        n  = icc.shape[0]
+        r  = finance_column(inputs, 'discount_rate', n)
+        L  = finance_column(inputs, 'project_lifetime', n)
+        Tc = finance_column(inputs, 'construction_time', n)
+        # interest during construction on capital spent evenly over Tc years
+        cff = 1. + 0.5 * ((1. + r)**Tc - 1.)
+        return (cff * capital_recovery_factor(r, L) * icc + c_opex) / nec
+
+
+class CashFlowModel(FinanceModel):
+    level = 2
+    name = 'full cash flow'
+
+    def evaluate(self, inputs):
+        _, icc, c_opex, nec = self.plant(inputs)
+        n   = icc.shape[0]
+        r   = finance_column(inputs, 'discount_rate', n)[:, None]
+        L   = finance_column(inputs, 'project_lifetime', n)[:, None]
+        Tc  = finance_column(inputs, 'construction_time', n)
+        tax = finance_column(inputs, 'tax_rate', n)[:, None]
+        D   = finance_column(inputs, 'depreciation_years', n)[:, None]
+        deg = finance_column(inputs, 'degradation', n)[:, None]
+
+        # capital spent at the start of each construction year, valued at commercial
+        # operation Tc - (k-1) years later
+        n_build = int(np.ceil(np.max(Tc))) if n else 0
+        k = np.arange(1, n_build + 1)[None, :]
+        share = np.clip(Tc[:, None] - (k - 1), 0., 1.) / np.maximum(Tc[:, None], 1e-300)
+        build = np.where(Tc > 0, np.sum(share * (1. + r)**(Tc[:, None] - (k - 1)), axis=1), 1.)
+        c0 = icc * build
+
+        # operating years 1..L
+        t = np.arange(1, int(np.ceil(np.max(L))) + 1)[None, :]
+        disc      = (1. + r)**(-t) * (t <= L)
+        energy    = nec[:, None] * (1. - deg)**(t - 1)
+        depreciation = np.where(t <= D, icc[:, None] / D, 0.)
+
+        pv_energy = np.sum((1. - tax) * energy * disc, axis=1)
+        pv_costs  = c0 + np.sum(((1. - tax) * c_opex[:, None] - tax * depreciation) * disc, axis=1)
+        return pv_costs / pv_energy
+
+
+MODELS = (FCRModel(), AnnuityModel(), CashFlowModel())
+
+
+def take(inputs, index, n):
+    """Select the cases `index` out of an n-case input mapping."""
+    sub = {}
+    for name, value in inputs.items():
+        value = np.asarray(value)
+        sub[name] = np.broadcast_to(value, (n,))[index] if value.ndim else value
+    return sub
+
+
+class ScreenResult(object):
+    def __init__(self, lcoe, level, bounds, evaluations, threshold):
+        self.lcoe        = lcoe         # best available lcoe of every case
+        self.level       = level        # model level that produced it
+        self.bounds      = bounds       # relative error bound of each calibrated level against the top one
+        self.evaluations = evaluations  # number of cases evaluated by each level
+        self.threshold   = threshold
+        self.below       = lcoe < threshold
+
+
+def calibrate(lcoe, reference):
+    """Least-squares fit reference ~ a*lcoe + b; returns (a, b, largest relative residual)."""
+    A = np.column_stack([lcoe, np.ones_like(lcoe)])
+    (a, b), _, _, _ = np.linalg.lstsq(A, reference, rcond=None)
+    return a, b, np.max(np.abs(a * lcoe + b - reference) / np.abs(reference))
+
+
+def screen(inputs, threshold, models=MODELS, pilot=256, safety=2.0, seed=0):
+    """Classify every case as above or below an lcoe threshold at least cost.
+
+    All cases are evaluated with models[0].  A random pilot sample is evaluated
+    with every model; each lower level is calibrated against the top model with
+    a linear fit on the pilot and `safety` times its largest relative residual
+    is the level's error bound.  Cases whose calibrated lcoe lies within that
+    bound of the threshold are passed to the next level, up to the top model,
+    whose results are taken as exact.  Cases never refined keep their
+    calibrated estimate.
+    """
+    n = case_count(inputs)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(pilot, n), replace=False))
+    pilot_inputs = take(inputs, sample, n)
+    pilot_lcoe = [model.evaluate(pilot_inputs) for model in models]
+    reference = pilot_lcoe[-1]
+    fits = [calibrate(p, reference) for p in pilot_lcoe[:-1]] + [(1.0, 0.0, 0.0)]
+    bounds = [safety * fit[2] for fit in fits]
+    evaluations = [sample.size] * len(models)
+
+    lcoe  = np.empty(n)
+    level = np.zeros(n, dtype=int)
+    active = np.arange(n)
+    for k, model in enumerate(models):
+        a, b, _ = fits[k]
+        lcoe[active]  = a * model.evaluate(take(inputs, active, n)) + b
+        level[active] = k
+        evaluations[k] += active.size
+        active = active[np.abs(lcoe[active] - threshold) <= bounds[k] * np.abs(lcoe[active])]
+        if active.size == 0:
+            break
+
+    # the pilot cases are known exactly
+    lcoe[sample]  = reference
+    level[sample] = len(models) - 1
+    return ScreenResult(lcoe, level, bounds, evaluations, threshold)
@@ -0,0 +1,383 @@
+import numpy as np
+
+from plant_financese import batch
+
+# Fused single-pass LCOE and Jacobian kernel.
+#
+# batch.evaluate allocates a full-size temporary for every intermediate of the
+# model.  The kernel below walks the cases once, keeps the intermediates in
+# float64 registers and writes only lcoe, the Jacobian rows and (on request)
+# the reported intermediates into buffers owned by the caller.  Inputs are read
+# through views of the caller's arrays, so with the numba backend a call
+# allocates no case-sized memory at all.  It is compiled with numba and parallelized over cores
+# when numba is installed; otherwise the same buffers are filled from the NumPy
+# path, so callers do not need to care which backend is active.
+
+try:
+    import numba
+    from numba import prange
+    HAVE_NUMBA = True
+except ImportError:
+    prange = range
+    HAVE_NUMBA = False
+
+# Row order of the Jacobian and intermediates buffers
+JAC_ROWS   = dict((key, i) for i, key in enumerate(batch.JACOBIAN_KEYS))
+INTER_ROWS = dict((key, i) for i, key in enumerate(batch.INTERMEDIATE_NAMES))
+
+
+def _fused(mr, tcc, nt, bos, opex, paep, taep, wlf, fcr, lcoe, do_lcoe, jac, do_jac, inter, do_inter):
+    for i in prange(lcoe.shape[0]):
+        t_rating = float(mr[i])
+        n_turbine = float(nt[i])
+        w = float(wlf[i])
+        f = float(fcr[i])
+
+        if paep[i] == 0:
+            park_aep     = n_turbine * taep[i] * (1. - w)
+            dpark_dtaep  = n_turbine * (1. - w)
+            dpark_dnturb = taep[i] * (1. - w)
+            dpark_dwlf   = -n_turbine * taep[i]
+            dpark_dpaep  = 0.0
+        else:
+            park_aep     = float(paep[i])
+            dpark_dtaep  = dpark_dnturb = dpark_dwlf = 0.0
+            dpark_dpaep  = 1.0
+
+        npr  = n_turbine * t_rating
+        nec  = park_aep / npr
+        icc  = (tcc[i] * t_rating + bos[i] * t_rating) / t_rating
+        copx = opex[i] * t_rating / t_rating
+        if do_lcoe:
+            lc = (icc * f + copx) / nec
+            lcoe[i] = lc
+        else:
+            # lcoe already holds the lcoe of this case
+            lc = float(lcoe[i])
+
+        if do_inter:
+            inter[0, i] = tcc[i]  * t_rating
+            inter[1, i] = bos[i]  * t_rating
+            inter[2, i] = opex[i] * t_rating
+            inter[3, i] = park_aep
+            inter[4, i] = npr
+            inter[5, i] = nec
+            inter[6, i] = icc
+            inter[7, i] = copx
+            inter[8, i] = icc * n_turbine * t_rating
+
+        if do_jac:
+            dnec_dnturb   = dpark_dnturb / npr - t_rating  * nec / npr
+            dnec_dtrating =                    - n_turbine * nec / npr
+            jac[0, i] = f / t_rating / nec
+            jac[1, i] = -dnec_dnturb * lc / nec
+            jac[2, i] = f / t_rating / nec
+            jac[3, i] = 1.0 / t_rating / nec
+            jac[4, i] = icc / nec
+            jac[5, i] = -dpark_dwlf  / npr * lc / nec
+            jac[6, i] = -dpark_dtaep / npr * lc / nec
+            jac[7, i] = -dpark_dpaep / npr * lc / nec
+            jac[8, i] = (-icc / t_rating * f - copx / t_rating) / nec - dnec_dtrating * lc / nec
+
+
+if HAVE_NUMBA:
+    _fused = numba.njit(parallel=True, cache=True)(_fused)
+
+
+class ScalarEvaluator(object):
+    """Lazy lcoe, Jacobian and intermediates of a single case in Python floats.
+
+    For one case the array kernels cost far more in call overhead than the
+    arithmetic itself, so PlantFinance evaluates its point with this instead.
+    set_inputs takes the nine inputs in the order of batch.INPUT_NAMES; as with
+    LazyEvaluator, every result is computed at most once per input point and
+    the Jacobian and intermediates reuse the quantities computed for lcoe.
+    The arithmetic follows batch.evaluate operation by operation.
+    """
+    def __init__(self):
+        self.x = None
+        self.evaluations = {'lcoe': 0, 'jacobian': 0, 'intermediates': 0}
+        self._lcoe = self._jac = self._inter = None
+
+    def set_inputs(self, x):
+        x = tuple(x)
+        if x != self.x:
+            self.x = x
+            self._lcoe = self._jac = self._inter = None
+
+    def _primal(self):
+        t_rating, tcc, n_turbine, bos, opex, paep, taep, wlf, fcr = self.x
+        park_aep = n_turbine * taep * (1. - wlf) if paep == 0 else paep
+        npr    = n_turbine * t_rating
+        nec    = park_aep / npr
+        icc    = (tcc * t_rating + bos * t_rating) / t_rating
+        c_opex = opex * t_rating / t_rating
+        self._base = (park_aep, npr, nec, icc, c_opex)
+        self._lcoe = (icc * fcr + c_opex) / nec
+        self.evaluations['lcoe'] += 1
+
+    @property
+    def lcoe(self):
+        if self._lcoe is None:
+            self._primal()
+        return self._lcoe
+
+    def jacobian(self):
+        """{batch.JACOBIAN_KEYS entry: float}"""
+        if self._jac is None:
+            lcoe = self.lcoe
+            t_rating, tcc, n_turbine, bos, opex, paep, taep, wlf, fcr = self.x
+            park_aep, npr, nec, icc, c_opex = self._base
+            if paep == 0:
+                dpark_dtaep, dpark_dwlf, dpark_dpaep = n_turbine * (1. - wlf), -n_turbine * taep, 0.0
+                dpark_dnturb = taep * (1. - wlf)
+            else:
+                dpark_dtaep, dpark_dwlf, dpark_dpaep = 0.0, 0.0, 1.0
+                dpark_dnturb = 0.0
+            dicc_dcturb   = 1.0 / t_rating
+            dnec_dnturb   = dpark_dnturb / npr - t_rating  * nec / npr
+            dnec_dtrating =                    - n_turbine * nec / npr
+            self._jac = {('lcoe', 'turbine_cost'           ): dicc_dcturb * fcr / nec,
+                         ('lcoe', 'turbine_number'         ): -dnec_dnturb * lcoe / nec,
+                         ('lcoe', 'turbine_bos_costs'      ): dicc_dcturb * fcr / nec,
+                         ('lcoe', 'turbine_avg_annual_opex'): dicc_dcturb / nec,
+                         ('lcoe', 'fixed_charge_rate'      ): icc / nec,
+                         ('lcoe', 'wake_loss_factor'       ): -(dpark_dwlf  / npr) * lcoe / nec,
+                         ('lcoe', 'turbine_aep'            ): -(dpark_dtaep / npr) * lcoe / nec,
+                         ('lcoe', 'park_aep'               ): -(dpark_dpaep / npr) * lcoe / nec,
+                         ('lcoe', 'machine_rating'         ): ((-icc / t_rating) * fcr + (-c_opex / t_rating)) / nec
+                                                              - dnec_dtrating * lcoe / nec}
+            self.evaluations['jacobian'] += 1
+        return self._jac
+
+    def intermediates(self):
+        """{batch.INTERMEDIATE_NAMES entry: float}"""
+        if self._inter is None:
+            self.lcoe
+            t_rating, tcc, n_turbine, bos, opex = self.x[:5]
+            park_aep, npr, nec, icc, c_opex = self._base
+            self._inter = {'c_turbine'      : tcc * t_rating,
+                           'c_bos_turbine'  : bos * t_rating,
+                           'c_opex_turbine' : opex * t_rating,
+                           'park_aep'       : park_aep,
+                           'npr'            : npr,
+                           'nec'            : nec,
+                           'icc'            : icc,
+                           'c_opex'         : c_opex,
+                           'capital_cost'   : icc * n_turbine * t_rating}
+            self.evaluations['intermediates'] += 1
+        return self._inter
+
+
+class Outputs(object):
+    """Preallocated output buffers for n cases.
+
+    lcoe has shape (n,), jac shape (9, n) with rows in the order of
+    batch.JACOBIAN_KEYS and inter shape (9, n) with rows in the order of
+    batch.INTERMEDIATE_NAMES.  Indexing with the batch.evaluate keys returns
+    views, so an Outputs can be used wherever a batch.evaluate result is.
+    """
+    def __init__(self, n, dtype=np.float64, jacobian=True, intermediates=False):
+        self.lcoe  = np.empty(n, dtype=dtype)
+        self.jac   = np.empty((len(JAC_ROWS), n), dtype=dtype) if jacobian else None
+        self.inter = np.empty((len(INTER_ROWS), n), dtype=dtype) if intermediates else None
+
+    def __len__(self):
+        return self.lcoe.shape[0]
+
+    def keys(self):
+        keys = ['lcoe']
+        if self.inter is not None:
+            keys.extend(batch.INTERMEDIATE_NAMES)
+        if self.jac is not None:
+            keys.extend(batch.JACOBIAN_KEYS)
+        return keys
+
+    def __getitem__(self, key):
+        if key == 'lcoe':
+            return self.lcoe
+        if key in JAC_ROWS and self.jac is not None:
+            return self.jac[JAC_ROWS[key]]
+        if key in INTER_ROWS and self.inter is not None:
+            return self.inter[INTER_ROWS[key]]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+
+def input_columns(inputs, dtype=np.float64):
+    """Column views of inputs without copying them.
+
+    inputs may be a mapping of names to scalars/arrays, a structured array with
+    fields named as the PlantFinance params, or any array or buffer-protocol
+    object of shape (n, 9) with the columns in the order of batch.INPUT_NAMES.
+    Columns already in `dtype` are used in place; scalars and missing optional
+    inputs become zero-stride views.
+    """
+    if not hasattr(inputs, 'keys'):
+        a = np.asarray(inputs)
+        if a.dtype.names is not None:
+            inputs = dict((name, a[name]) for name in a.dtype.names)
+        elif a.ndim == 2 and a.shape[1] == len(batch.INPUT_NAMES):
+            inputs = dict((name, a[:, j]) for j, name in enumerate(batch.INPUT_NAMES))
+        else:
+            raise ValueError('Plant_FinanceSE inputs must be a mapping, a structured array or an (n, %d) array' % len(batch.INPUT_NAMES))
+
+    cols = {}
+    for name in batch.INPUT_NAMES:
+        if name in inputs:
+            cols[name] = np.asarray(inputs[name], dtype=dtype)
+        elif name in batch.DEFAULTS:
+            cols[name] = np.asarray(batch.DEFAULTS[name], dtype=dtype)
+        else:
+            raise KeyError('Plant_FinanceSE batch input "%s" is required' % name)
+
+    n = max(c.size for c in cols.values())
+    for name, c in cols.items():
+        if c.ndim == 0 or c.size == 1:
+            cols[name] = np.broadcast_to(c.reshape(()), (n,))
+        elif c.shape != (n,):
+            raise ValueError('Plant_FinanceSE input "%s" has shape %s, expected (%d,)' % (name, c.shape, n))
+    return cols
+
+
+def evaluate_into(cols, lcoe, jac=None, inter=None, check=True, backend=None, lcoe_valid=False):
+    """Evaluate the cases in cols (see input_columns) into the given buffers.
+
+    lcoe has shape (n,), jac and inter, if given, shape (9, n) as in Outputs.
+    backend is 'numba', 'numpy' or None for the fastest one available.  With
+    lcoe_valid=True lcoe already holds the lcoe of cols and only jac and inter
+    are filled, reusing it.
+    """
+    # the numba kernel does no bounds checking, so the buffers are checked here
+    n = cols['machine_rating'].shape[0]
+    for name in batch.INPUT_NAMES:
+        if cols[name].shape != (n,):
+            raise ValueError('Plant_FinanceSE input "%s" has shape %s, expected (%d,)' % (name, cols[name].shape, n))
+    if lcoe.shape != (n,):
+        raise ValueError('lcoe buffer has shape %s, expected (%d,)' % (lcoe.shape, n))
+    for name, buf, rows in [('jac', jac, len(JAC_ROWS)), ('inter', inter, len(INTER_ROWS))]:
+        if buf is not None and buf.shape != (rows, n):
+            raise ValueError('%s buffer has shape %s, expected (%d, %d)' % (name, buf.shape, rows, n))
+    if check:
+        batch.check_inputs(cols)
+    if backend is None:
+        backend = 'numba' if HAVE_NUMBA else 'numpy'
+
+    if backend == 'numba':
+        if not HAVE_NUMBA:
+            raise ImportError('The numba backend of Plant_FinanceSE requires numba to be installed')
+        empty = np.empty((0, 0), dtype=lcoe.dtype)
+        _fused(cols['machine_rating'], cols['tcc_per_kW'], cols['turbine_number'], cols['bos_per_kW'],
+               cols['opex_per_kW'], cols['park_aep'], cols['turbine_aep'], cols['wake_loss_factor'],
+               cols['fixed_charge_rate'], lcoe, not lcoe_valid, empty if jac is None else jac, jac is not None,
+               empty if inter is None else inter, inter is not None)
+    elif backend == 'numpy':
+        out = batch.evaluate(cols, jacobian=jac is not None, intermediates=inter is not None, check=False, dtype=lcoe.dtype,
+                             lcoe=lcoe if lcoe_valid else None)
+        if not lcoe_valid:
+            np.copyto(lcoe, out['lcoe'])
+        if jac is not None:
+            for key, row in JAC_ROWS.items():
+                np.copyto(jac[row], out[key])
+        if inter is not None:
+            for key, row in INTER_ROWS.items():
+                np.copyto(inter[row], out[key])
+    else:
+        raise ValueError('Unknown Plant_FinanceSE kernel backend "%s"' % backend)
+
+
+def evaluate(inputs, out=None, jacobian=True, intermediates=False, check=True, dtype=np.float64, backend=None):
+    """Evaluate inputs (see input_columns) into out, an Outputs, and return it.
+
+    When out is None a new Outputs is allocated; host applications evaluating
+    in a loop should allocate one Outputs up front and pass it every time.
+    jacobian and intermediates only apply to a newly allocated out; a given out
+    is filled with whatever buffers it holds.
+    """
+    if out is not None:
+        dtype = out.lcoe.dtype
+    cols = input_columns(inputs, dtype=dtype)
+    if out is None:
+        out = Outputs(cols['machine_rating'].shape[0], dtype, jacobian, intermediates)
+    elif len(out) != cols['machine_rating'].shape[0]:
+        raise ValueError('Output buffers hold %d cases, inputs have %d' % (len(out), cols['machine_rating'].shape[0]))
+    evaluate_into(cols, out.lcoe, out.jac, out.inter, check=check, backend=backend)
+    return out
+
+
+class LazyEvaluator(object):
+    """Evaluate lcoe, the Jacobian and the intermediates only when asked for.
+
+    set_inputs copies the inputs into owned buffers and marks the results
+    stale only if the inputs changed.  Each of lcoe, jacobian and
+    intermediates is then computed at most once per input point, on first
+    access; the Jacobian and intermediates reuse a current lcoe instead of
+    recomputing it, and a kernel call that fills them without one also fills
+    lcoe.  Primal-only sweeps and drivers that never linearize pay for lcoe
+    alone.
+    """
+    def __init__(self, n=1, dtype=np.float64, check=True, backend=None):
+        self.dtype   = np.dtype(dtype)
+        self.check   = check
+        self.backend = backend
+        self.n       = n
+        self.inputs  = np.zeros((len(batch.INPUT_NAMES), n), dtype=self.dtype)
+        self.cols    = dict((name, self.inputs[j]) for j, name in enumerate(batch.INPUT_NAMES))
+        self.out     = Outputs(n, self.dtype, jacobian=True, intermediates=True)
+        self.evaluations = {'lcoe': 0, 'jacobian': 0, 'intermediates': 0}
+        self._valid  = set()
+        self._checked = False
+
+    def set_inputs(self, inputs):
+        cols = input_columns(inputs, dtype=self.dtype)
+        if cols['machine_rating'].shape[0] != self.n:
+            raise ValueError('LazyEvaluator holds %d cases, inputs have %d' % (self.n, cols['machine_rating'].shape[0]))
+        if self._valid and all(np.array_equal(self.cols[name], cols[name]) for name in batch.INPUT_NAMES):
+            return
+        for name in batch.INPUT_NAMES:
+            np.copyto(self.cols[name], cols[name])
+        self.invalidate()
+
+    def invalidate(self):
+        """Mark all results stale, e.g. after changing self.inputs in place."""
+        self._valid = set()
+        self._checked = False
+
+    def _compute(self, jac=False, inter=False):
+        if self.check and not self._checked:
+            batch.check_inputs(self.cols)
+            self._checked = True
+        jac   = jac   and 'jacobian' not in self._valid
+        inter = inter and 'intermediates' not in self._valid
+        lcoe_valid = 'lcoe' in self._valid
+        evaluate_into(self.cols, self.out.lcoe, self.out.jac if jac else None, self.out.inter if inter else None,
+                      check=False, backend=self.backend, lcoe_valid=lcoe_valid)
+        if not lcoe_valid:
+            self._valid.add('lcoe')
+            self.evaluations['lcoe'] += 1
+        if jac:
+            self._valid.add('jacobian')
+            self.evaluations['jacobian'] += 1
+        if inter:
+            self._valid.add('intermediates')
+            self.evaluations['intermediates'] += 1
+
+    @property
+    def lcoe(self):
+        if 'lcoe' not in self._valid:
+            self._compute()
+        return self.out.lcoe
+
+    def jacobian(self):
+        """Outputs whose Jacobian rows are current."""
+        if 'jacobian' not in self._valid:
+            self._compute(jac=True)
+        return self.out
+
+    def intermediates(self):
+        """Outputs whose intermediates rows are current."""
+        if 'intermediates' not in self._valid:
+            self._compute(inter=True)
+        return self.out
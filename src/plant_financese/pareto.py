@@ -0,0 +1,300 @@
+import hashlib
+import json
+
+import numpy as np
+
+from plant_financese import batch
+
+# Multi-objective search over PlantFinance inputs.
+#
+# An NSGA-II style genetic algorithm evaluates every generation as one batch
+# and keeps all feasible non-dominated designs it has seen in a ParetoArchive.
+# Objectives are minimized; quantities to maximize are negated through
+# OBJECTIVES.  Constraints are (lower, upper) bounds on any of the quantities
+# and are handled with constraint domination (feasible designs first, then
+# least violation).
+
+# name -> (sign, quantity): the objective is sign * quantity
+OBJECTIVES = {'lcoe'         : ( 1.0, 'lcoe'),
+              'capital_cost' : ( 1.0, 'capital_cost'),
+              'capacity'     : (-1.0, 'capacity')}
+
+
+def quantities(cols, gradients=False):
+    """lcoe [USD/kW/h], capital_cost [USD] and capacity [kW] of the cases in cols.
+
+    With gradients=True also returns their derivatives with respect to the
+    inputs as {quantity: {input: array}}.
+    """
+    out = batch.evaluate(cols, jacobian=gradients, intermediates=True)
+    q = {'lcoe': out['lcoe'], 'capital_cost': out['capital_cost'], 'capacity': out['npr']}
+    if not gradients:
+        return q
+    zero = np.zeros_like(out['lcoe'])
+    n_turbine, t_rating = cols['turbine_number'], cols['machine_rating']
+    per_kW = cols['tcc_per_kW'] + cols['bos_per_kW']
+    grad = {'lcoe'         : batch.input_gradients(cols, out),
+            'capital_cost' : dict((name, zero) for name in batch.INPUT_NAMES),
+            'capacity'     : dict((name, zero) for name in batch.INPUT_NAMES)}
+    grad['capital_cost'].update({'tcc_per_kW'     : n_turbine * t_rating,
+                                 'bos_per_kW'     : n_turbine * t_rating,
+                                 'machine_rating' : per_kW * n_turbine,
+                                 'turbine_number' : per_kW * t_rating})
+    grad['capacity'].update({'machine_rating' : n_turbine,
+                             'turbine_number' : t_rating})
+    return q, grad
+
+
+def pareto_mask(F):
+    """Boolean mask of the non-dominated rows of the (n, m) objective array F.
+
+    Two objectives take one sort and a running minimum, O(n log n).  More
+    objectives sort by the first one and sweep the points in blocks, checking
+    each block against the front found so far, so the cost grows with the size
+    of the front rather than with n**2.
+    """
+    F = np.asarray(F, dtype=np.float64)
+    n, m = F.shape
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    order = np.lexsort(F.T[::-1])
+    Fs = F[order]
+    # of identical points only the first in sort order is kept
+    if m == 1:
+        mask[order[0]] = True
+        return mask
+    if m == 2:
+        # sorted by f0 then f1: a point is on the front if its f1 beats every earlier f1
+        best = np.minimum.accumulate(Fs[:, 1])
+        on_front = np.empty(n, dtype=bool)
+        on_front[0] = True
+        on_front[1:] = Fs[1:, 1] < best[:-1]
+        mask[order[on_front]] = True
+        return mask
+
+    front = np.empty((0, m))
+    block = 1024
+    for start in range(0, n, block):
+        cand = Fs[start:start + block]
+        idx  = order[start:start + block]
+        # weakly dominated by the front found so far (an earlier point in sort order)
+        if front.shape[0]:
+            dominated = np.zeros(cand.shape[0], dtype=bool)
+            for fstart in range(0, front.shape[0], block):
+                f = front[fstart:fstart + block]
+                dominated |= np.any(np.all(f[None, :, :] <= cand[:, None, :], axis=2), axis=1)
+            cand, idx = cand[~dominated], idx[~dominated]
+        # dominance inside the block: only earlier points in sort order can dominate
+        le = np.all(cand[None, :, :] <= cand[:, None, :], axis=2)
+        le = np.tril(le, k=-1)
+        keep = ~np.any(le, axis=1)
+        cand, idx = cand[keep], idx[keep]
+        front = np.vstack([front, cand])
+        mask[idx] = True
+    return mask
+
+
+def nondominated_sort(F):
+    """NSGA-II front index of every row of F (0 for the Pareto front)."""
+    F = np.asarray(F, dtype=np.float64)
+    rank = np.full(F.shape[0], -1, dtype=int)
+    remaining = np.arange(F.shape[0])
+    r = 0
+    while remaining.size:
+        front = pareto_mask(F[remaining])
+        # duplicates of a front point belong to the same front
+        dup = np.zeros(remaining.size, dtype=bool)
+        if np.any(~front):
+            Ff = F[remaining[front]]
+            rest = F[remaining[~front]]
+            dup[~front] = np.any(np.all(rest[:, None, :] == Ff[None, :, :], axis=2), axis=1)
+        rank[remaining[front | dup]] = r
+        remaining = remaining[~(front | dup)]
+        r += 1
+    return rank
+
+
+def crowding_distance(F):
+    F = np.asarray(F, dtype=np.float64)
+    n, m = F.shape
+    d = np.zeros(n)
+    if n <= 2:
+        d[:] = np.inf
+        return d
+    for j in range(m):
+        order = np.argsort(F[:, j], kind='mergesort')
+        span = F[order[-1], j] - F[order[0], j]
+        d[order[0]] = d[order[-1]] = np.inf
+        if span > 0:
+            d[order[1:-1]] += (F[order[2:], j] - F[order[:-2], j]) / span
+    return d
+
+
+class ParetoArchive(object):
+    """Non-dominated set of all feasible designs added so far."""
+    def __init__(self, names, objectives):
+        self.names = list(names)
+        self.objectives = list(objectives)
+        self.X = np.empty((0, len(self.names)))
+        self.F = np.empty((0, len(self.objectives)))
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def update(self, X, F):
+        X = np.vstack([self.X, X])
+        F = np.vstack([self.F, F])
+        mask = pareto_mask(F)
+        self.X, self.F = X[mask], F[mask]
+
+
+class ParetoResult(object):
+    def __init__(self, archive, fixed, generations, evaluations):
+        self.names       = archive.names
+        self.objectives  = archive.objectives
+        self.generations = generations
+        self.evaluations = evaluations
+        order = np.argsort(archive.F[:, 0], kind='mergesort')
+        self.X = archive.X[order]
+        self.design = dict((name, self.X[:, j]) for j, name in enumerate(self.names))
+        cols = batch.as_columns(dict(fixed, **self.design))
+        q, grad = quantities(cols, gradients=True)
+        # objective values and d(objective)/d(design variable) on the front
+        self.F = np.column_stack([OBJECTIVES[o][0] * q[OBJECTIVES[o][1]] for o in self.objectives])
+        self.gradients = dict((o, dict((name, OBJECTIVES[o][0] * grad[OBJECTIVES[o][1]][name]) for name in self.names))
+                              for o in self.objectives)
+
+
+def violation(q, constraints):
+    v = np.zeros_like(q['lcoe'])
+    for name, (lower, upper) in constraints.items():
+        scale = max(abs(lower) if lower is not None else 0., abs(upper) if upper is not None else 0., 1e-300)
+        if lower is not None:
+            v += np.maximum(lower - q[name], 0.) / scale
+        if upper is not None:
+            v += np.maximum(q[name] - upper, 0.) / scale
+    return v
+
+
+def nsga2(design, fixed, objectives=('lcoe', 'capital_cost'), constraints=None, integer=('turbine_number',),
+          population=100, generations=50, crossover_eta=15., mutation_eta=20., seed=0, session=None):
+    """Search the Pareto front of `objectives` over the `design` variables.
+
+    design maps input names to (lower, upper) bounds, fixed holds the remaining
+    PlantFinance inputs and constraints maps quantity names ('lcoe',
+    'capital_cost', 'capacity') to (lower, upper) bounds, either may be None.
+    Design variables listed in `integer` are rounded.  Returns a ParetoResult
+    with the archive of feasible non-dominated designs, their objectives and
+    the objective gradients with respect to the design variables.
+
+    With a session.Session the cases are evaluated through its journal and the
+    search state is saved after every generation; running again with the same
+    session and the same arguments, except for a larger `generations`,
+    resumes from the last saved generation.  Any other change starts afresh.
+    """
+    constraints = {} if constraints is None else constraints
+    names = list(design)
+    lower = np.array([design[name][0] for name in names], dtype=np.float64)
+    upper = np.array([design[name][1] for name in names], dtype=np.float64)
+    is_int = np.array([name in integer for name in names])
+    rng = np.random.default_rng(seed)
+    archive = ParetoArchive(names, objectives)
+
+    def evaluate(X):
+        cols = batch.as_columns(dict(fixed, **dict((name, X[:, j]) for j, name in enumerate(names))))
+        if session is None:
+            q = quantities(cols)
+        else:
+            out = session.evaluate(cols)
+            q = {'lcoe': out['lcoe'], 'capital_cost': out['capital_cost'], 'capacity': out['npr']}
+        F = np.column_stack([OBJECTIVES[o][0] * q[OBJECTIVES[o][1]] for o in objectives])
+        return F, violation(q, constraints)
+
+    def ranking(F, v):
+        # constraint domination: feasible designs by front, infeasible ones after them by violation
+        rank = np.empty(F.shape[0])
+        feasible = v == 0
+        rank[feasible] = nondominated_sort(F[feasible])
+        worst = rank[feasible].max() + 1 if np.any(feasible) else 0
+        rank[~feasible] = worst + np.argsort(np.argsort(v[~feasible], kind='mergesort'), kind='mergesort')
+        crowd = np.zeros(F.shape[0])
+        for r in np.unique(rank[feasible]):
+            sel = np.flatnonzero(rank == r)
+            crowd[sel] = crowding_distance(F[sel])
+        return rank, crowd
+
+    def repair(X):
+        X = np.clip(X, lower, upper)
+        X[:, is_int] = np.round(X[:, is_int])
+        return X
+
+    # everything that shapes the search; a saved state is resumed only if they all match
+    settings = {'design': dict((name, [float(design[name][0]), float(design[name][1])]) for name in names),
+                'names': names, 'fixed': dict((k, np.asarray(v, dtype=np.float64).tolist()) for k, v in fixed.items()),
+                'objectives': list(objectives), 'integer': sorted(integer),
+                'constraints': dict((k, [None if b is None else float(b) for b in c]) for k, c in constraints.items()),
+                'population': population, 'crossover_eta': float(crossover_eta), 'mutation_eta': float(mutation_eta),
+                'seed': seed}
+    settings = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+    saved = session.state.get('nsga2') if session is not None and session.state else None
+    if saved is not None and saved['settings'] == settings:
+        start = saved['generation']
+        X, F, v = np.array(saved['X']), np.array(saved['F']), np.array(saved['v'])
+        archive.X = np.array(saved['archive_X']).reshape(-1, len(names))
+        archive.F = np.array(saved['archive_F']).reshape(-1, len(objectives))
+        evaluations = saved['evaluations']
+        rng.bit_generator.state = saved['rng']
+    else:
+        start = 0
+        X = repair(lower + rng.random((population, len(names))) * (upper - lower))
+        F, v = evaluate(X)
+        archive.update(X[v == 0], F[v == 0])
+        evaluations = population
+
+    def checkpoint(generation):
+        if session is not None:
+            session.save_state({'nsga2': {'settings': settings, 'generation': generation,
+                                          'X': X.tolist(), 'F': F.tolist(), 'v': v.tolist(),
+                                          'archive_X': archive.X.tolist(), 'archive_F': archive.F.tolist(),
+                                          'evaluations': evaluations, 'rng': rng.bit_generator.state}})
+
+    if start == 0:
+        checkpoint(0)
+
+    for generation in range(start, generations):
+        rank, crowd = ranking(F, v)
+
+        # binary tournament on (rank, -crowding)
+        a, b = rng.integers(0, population, (2, population))
+        better = (rank[a] < rank[b]) | ((rank[a] == rank[b]) & (crowd[a] > crowd[b]))
+        parents = X[np.where(better, a, b)]
+
+        # simulated binary crossover of consecutive parents; an odd last parent
+        # is paired with the first one
+        pairs = np.arange(2 * ((population + 1) // 2)) % population
+        p1, p2 = parents[pairs[0::2]], parents[pairs[1::2]]
+        u = rng.random(p1.shape)
+        beta = np.where(u <= 0.5, (2*u)**(1./(crossover_eta + 1)), (1./(2*(1 - u)))**(1./(crossover_eta + 1)))
+        c1 = 0.5 * ((1 + beta) * p1 + (1 - beta) * p2)
+        c2 = 0.5 * ((1 - beta) * p1 + (1 + beta) * p2)
+        children = np.vstack([c1, c2])[:population]
+
+        # polynomial mutation, each variable with probability 1/n_var
+        mutate = rng.random(children.shape) < 1. / len(names)
+        u = rng.random(children.shape)
+        delta = np.where(u < 0.5, (2*u)**(1./(mutation_eta + 1)) - 1, 1 - (2*(1 - u))**(1./(mutation_eta + 1)))
+        children = repair(children + mutate * delta * (upper - lower))
+
+        Fc, vc = evaluate(children)
+        evaluations += children.shape[0]
+        archive.update(children[vc == 0], Fc[vc == 0])
+
+        # environmental selection on parents + children
+        X, F, v = np.vstack([X, children]), np.vstack([F, Fc]), np.concatenate([v, vc])
+        rank, crowd = ranking(F, v)
+        keep = np.lexsort((-crowd, rank))[:population]
+        X, F, v = X[keep], F[keep], v[keep]
+        checkpoint(generation + 1)
+
+    return ParetoResult(archive, fixed, generations, evaluations)
@@ -1,27 +1,36 @@
 from openmdao.api import Component, Group, Problem
 import numpy as np
 
+from plant_financese import batch, kernels, schema
+
 class PlantFinance(Component):
-    def __init__(self, verbosity = False):
+    def __init__(self, verbosity = False, relax_turbine_number = False):
         super(PlantFinance, self).__init__()
 
-        # Inputs
-        self.add_param('machine_rating',    val=0.0, units='kW',        desc='Rating of the turbine')
-        self.add_param('tcc_per_kW' ,       val=0.0, units='USD/kW',    desc='A wind turbine capital cost')
-        self.add_param('turbine_number',    val=0,                      desc='Number of turbines at plant', pass_by_obj=True)
-        self.add_param('bos_per_kW',        val=0.0, units='USD/kW',    desc='Balance of system costs of the turbine')
-        self.add_param('opex_per_kW',       val=0.0, units='USD/kW/yr', desc='Average annual operational expenditures of the turbine')
-        self.add_param('park_aep',          val=0.0, units='kW*h',       desc='Annual Energy Production of the wind plant')
-        self.add_param('turbine_aep',       val=0.0, units='kW*h',       desc='Annual Energy Production of the wind turbine')
-    
-        # Parameters
-        self.add_param('wake_loss_factor',  val=0.15,                   desc='The losses in AEP due to waked conditions')
-        self.add_param('fixed_charge_rate', val=0.079216644,            desc = 'Fixed charge rate for coe calculation')
+        # Inputs and parameters, with units and descriptions from the schema
+        for field in schema.INPUTS:
+            if field.name == 'turbine_number':
+                if relax_turbine_number:
+                    # continuous relaxation, so that the turbine_number derivative can be used by gradient-based drivers
+                    self.add_param('turbine_number', val=0.0, desc=field.desc + ', relaxed to a float')
+                else:
+                    self.add_param('turbine_number', val=0, desc=field.desc, pass_by_obj=True)
+            elif field.units is None:
+                self.add_param(field.name, val=field.default, desc=field.desc)
+            else:
+                self.add_param(field.name, val=field.default, units=field.units, desc=field.desc)
 
         # Outputs
-        self.add_output('lcoe',             val=0.0, units='USD/kW/h',   desc='Levelized cost of energy for the wind plant')
+        for field in schema.OUTPUTS:
+            self.add_output(field.name, val=field.default, units=field.units, desc=field.desc)
         
         self.verbosity = verbosity
+        self.relax_turbine_number = relax_turbine_number
+
+        # lcoe is computed on every solve_nonlinear, the Jacobian only in linearize
+        # and the intermediates only for the verbosity printout.  A single point
+        # is evaluated in plain Python; the array kernels only pay off for batches.
+        self._point = kernels.ScalarEvaluator()
         
     
     def solve_nonlinear(self, params, unknowns, resids):
@@ -55,61 +64,25 @@ class PlantFinance(Component):
         if c_opex_turbine == 0:
             print('WARNING: The Opex costs of the turbine are not initialized correctly and they are currently equal to 0 USD. Check the connections to Plant_FinanceSE')
         
-        if params['park_aep'] == 0:
-            if turb_aep != 0:
-                park_aep     =  n_turbine * turb_aep * (1. - wlf)
-                dpark_dtaep  =  n_turbine            * (1. - wlf)
-                dpark_dnturb =              turb_aep * (1. - wlf)
-                dpark_dwlf   = -n_turbine * turb_aep
-                dpark_dpaep  = 0.0
-            else:
-                exit('ERROR: AEP is not connected properly. Both turbine_aep and park_aep are currently equal to 0 Wh. Check the connections to Plant_FinanceSE')
-        else:
-            park_aep    = params['park_aep']
-            dpark_dpaep = 1.0
-            dpark_dtaep = dpark_dnturb = dpark_dwlf = 0.0
-        
-        npr           = n_turbine * t_rating # net park rating, used in net energy capture calculation below
-        dnpr_dnturb   =             t_rating
-        dnpr_dtrating = n_turbine
-        
-        nec           = park_aep     / npr # net energy rating, per COE report
-        dnec_dwlf     = dpark_dwlf   / npr
-        dnec_dtaep    = dpark_dtaep  / npr
-        dnec_dpaep    = dpark_dpaep  / npr
-        dnec_dnturb   = dpark_dnturb / npr - dnpr_dnturb   * nec / npr
-        dnec_dtrating =                               - dnpr_dtrating * nec / npr
-        
-        icc     = (c_turbine + c_bos_turbine) / t_rating #$/kW, changed per COE report
-        c_opex  = (c_opex_turbine) / t_rating  # $/kW, changed per COE report
-
-        dicc_dtrating   = -icc / t_rating
-        dcopex_dtrating = -c_opex / t_rating
-        dicc_dcturb = dicc_dcbos = dcopex_dcopex = 1.0 / t_rating
-           
-        #compute COE and LCOE values
-        lcoe = ((icc * fcr + c_opex) / nec) # changed per COE report
+        if params['park_aep'] == 0 and turb_aep == 0:
+            exit('ERROR: AEP is not connected properly. Both turbine_aep and park_aep are currently equal to 0 Wh. Check the connections to Plant_FinanceSE')
+
+        self._point.set_inputs([float(params[name]) for name in batch.INPUT_NAMES])
+        lcoe = self._point.lcoe
         unknowns['lcoe'] = lcoe
         
-        self.J = {}
-        self.J['lcoe', 'turbine_cost'            ] = dicc_dcturb*fcr /nec
-        self.J['lcoe', 'turbine_number'          ] = - dnec_dnturb*lcoe/nec
-        self.J['lcoe', 'turbine_bos_costs'       ] = dicc_dcbos *fcr /nec
-        self.J['lcoe', 'turbine_avg_annual_opex' ] = dcopex_dcopex   /nec
-        self.J['lcoe', 'fixed_charge_rate'       ] = icc / nec
-        self.J['lcoe', 'wake_loss_factor'        ] = -dnec_dwlf *lcoe/nec
-        self.J['lcoe', 'turbine_aep'             ] = -dnec_dtaep*lcoe/nec
-        self.J['lcoe', 'park_aep'                ] = -dnec_dpaep*lcoe/nec
-        self.J['lcoe', 'machine_rating'          ] = (dicc_dtrating*fcr + dcopex_dtrating)/nec - dnec_dtrating*lcoe/nec
-        
         if self.verbosity == True:
+            out      = self._point.intermediates()
+            park_aep = out['park_aep']
+            icc      = out['icc']
+            nec      = out['nec']
             print('################################################')
             print('Computation of LCoE from Plant_FinanceSE')
             print('Number of turbines in the park    %u'              % n_turbine)
             print('Turbine rating                    %.2f kW'         % t_rating)
             print('Turbine capital cost per kW       %.2f USD/kW'     % tcc_per_kW)
             print('BoS costs per kW                  %.2f USD/kW'     % bos_per_kW)
-            print('Opex costs per kW                 %.2f USD/kW'     % opex_per_kW)
+            print('Opex costs per kW                 %.2f USD/kW/yr'  % opex_per_kW)
             print('Fixed charge rate                 %.2f %%'         % (fcr * 100.))
             print('Wake loss factor                  %.2f %%'         % (wlf * 100.))
             print('AEP of the single turbine         %.2f GWh'        % (turb_aep * 1.e-006))
@@ -118,13 +91,15 @@ class PlantFinance(Component):
             print('Total initial capital cost        %.2f M USD'      % (icc * n_turbine * t_rating * 1.e-006))  
             print('Opex costs of the park            %.2f M USD/yr'   % (c_opex_turbine * n_turbine * 1.e-006))              
             print('Net energy capture                %.2f MWh/MW/yr'  % nec)
-            print('LCoE                              %.2f USD/MW'     % (lcoe  * 1.e003)) #removed "coe", best to have only one metric for cost
+            print('LCoE                              %.2f USD/MWh'    % schema.convert(lcoe, 'lcoe', to_units='USD/MWh')) #removed "coe", best to have only one metric for cost
             print('################################################')
             
                     
 
     def linearize(self, params, unknowns, resids):
-        
+        # reuses the point of the last solve_nonlinear unless params changed since
+        self._point.set_inputs([float(params[name]) for name in batch.INPUT_NAMES])
+        self.J = dict(self._point.jacobian())
         return self.J
 
     
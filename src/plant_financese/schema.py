@@ -0,0 +1,134 @@
+import numpy as np
+
+from plant_financese import batch
+
+# Units and valid ranges of the PlantFinance inputs and outputs, declared once.
+#
+# PlantFinance registers its params from INPUTS, and bulk data from external
+# files goes through a Plan: compile_plan looks up the unit conversion factor
+# and the bounds of every column once, and Plan.apply then converts and
+# validates a whole batch of cases with a few array operations, whatever the
+# number of cases.
+
+
+class Field(object):
+    def __init__(self, name, units, default, lower, upper, desc):
+        self.name    = name
+        self.units   = units     # canonical units, None if dimensionless
+        self.default = default
+        self.lower   = lower     # valid range, inclusive, in canonical units
+        self.upper   = upper
+        self.desc    = desc
+
+
+INPUTS = (Field('machine_rating',    'kW',        0.0,         1.0, 1.e005,  'Rating of the turbine'),
+          Field('tcc_per_kW',        'USD/kW',    0.0,         0.0, 1.e005,  'A wind turbine capital cost'),
+          Field('turbine_number',    None,        0,           1.0, 1.e005,  'Number of turbines at plant'),
+          Field('bos_per_kW',        'USD/kW',    0.0,         0.0, 1.e005,  'Balance of system costs of the turbine'),
+          Field('opex_per_kW',       'USD/kW/yr', 0.0,         0.0, 1.e004,  'Average annual operational expenditures of the turbine'),
+          Field('park_aep',          'kW*h',      0.0,         0.0, 1.e013,  'Annual Energy Production of the wind plant'),
+          Field('turbine_aep',       'kW*h',      0.0,         0.0, 1.e009,  'Annual Energy Production of the wind turbine'),
+          Field('wake_loss_factor',  None,        0.15,        0.0, 1.0,     'The losses in AEP due to waked conditions'),
+          Field('fixed_charge_rate', None,        0.079216644, 0.0, 1.0,     'Fixed charge rate for coe calculation'))
+
+OUTPUTS = (Field('lcoe',             'USD/kW/h',  0.0,         0.0, np.inf,  'Levelized cost of energy for the wind plant'),)
+
+FIELDS = dict((f.name, f) for f in INPUTS + OUTPUTS)
+
+# canonical units -> {accepted units: factor to canonical}
+UNITS = {None        : {None: 1.0, '': 1.0, '%': 1.e-002},
+         'kW'        : {'W': 1.e-003, 'kW': 1.0, 'MW': 1.e003, 'GW': 1.e006},
+         'kW*h'      : {'W*h': 1.e-003, 'Wh': 1.e-003, 'kW*h': 1.0, 'kWh': 1.0, 'MW*h': 1.e003, 'MWh': 1.e003,
+                        'GW*h': 1.e006, 'GWh': 1.e006},
+         'USD/kW'    : {'USD/W': 1.e003, 'USD/kW': 1.0, 'USD/MW': 1.e-003},
+         'USD/kW/yr' : {'USD/W/yr': 1.e003, 'USD/kW/yr': 1.0, 'USD/MW/yr': 1.e-003},
+         'USD/kW/h'  : {'USD/W/h': 1.e003, 'USD/kW/h': 1.0, 'USD/kWh': 1.0, 'USD/MW/h': 1.e-003, 'USD/MWh': 1.e-003}}
+
+
+def factor(name, units):
+    """Factor converting values of field `name` given in `units` to its canonical units."""
+    canonical = FIELDS[name].units
+    try:
+        return UNITS[canonical][units]
+    except KeyError:
+        raise ValueError('Cannot convert %s from "%s" to "%s"' % (name, units, canonical))
+
+
+def convert(values, name, from_units=None, to_units=None):
+    """Convert values of field `name` between units (None means canonical)."""
+    canonical = FIELDS[name].units
+    f = factor(name, canonical if from_units is None else from_units)
+    t = factor(name, canonical if to_units is None else to_units)
+    return np.asarray(values) * (f / t)
+
+
+class Plan(object):
+    """Conversion and validation of one table layout, see compile_plan."""
+    def __init__(self, columns, names, scale, lower, upper, defaults):
+        self.columns  = columns     # column names in the source
+        self.names    = names       # matching PlantFinance input names
+        self.scale    = scale       # (k,) conversion factors
+        self.lower    = lower       # (k,) bounds in canonical units
+        self.upper    = upper
+        self.defaults = defaults    # inputs not in the source
+
+    def apply(self, data, on_invalid='raise'):
+        """Convert and validate a batch of cases.
+
+        data is a mapping of source column names to arrays or an (n, k) array
+        with the columns in plan order.  Returns (inputs, valid) where inputs is
+        a batch.evaluate mapping in canonical units and valid a boolean mask of
+        the cases within range.  on_invalid is 'raise', 'mask' (only report) or
+        'clip' (clip to the valid range).
+        """
+        if hasattr(data, 'keys'):
+            table = np.column_stack([np.asarray(data[c], dtype=np.float64) for c in self.columns])
+        else:
+            table = np.asarray(data, dtype=np.float64)
+            if table.ndim != 2 or table.shape[1] != len(self.columns):
+                raise ValueError('Expected an (n, %d) table' % len(self.columns))
+        table = table * self.scale
+        bad = (table < self.lower) | (table > self.upper) | np.isnan(table)
+        valid = ~np.any(bad, axis=1)
+
+        if not np.all(valid):
+            if on_invalid == 'raise':
+                counts = np.sum(bad, axis=0)
+                msg = ', '.join('%s (%d)' % (c, k) for c, k in zip(self.columns, counts) if k)
+                raise ValueError('Plant_FinanceSE inputs out of range for %d case(s): %s' % (np.count_nonzero(~valid), msg))
+            elif on_invalid == 'clip':
+                table = np.clip(table, self.lower, self.upper)
+            elif on_invalid != 'mask':
+                raise ValueError('on_invalid must be "raise", "mask" or "clip"')
+
+        inputs = dict(self.defaults)
+        for j, name in enumerate(self.names):
+            inputs[name] = table[:, j]
+        return inputs, valid
+
+
+def compile_plan(columns, units=None, rename=None):
+    """Compile the conversion and validation plan for a table layout.
+
+    columns lists the source column names, units maps source columns to the
+    units their values are in (canonical units if missing) and rename maps
+    source column names to PlantFinance input names.  Inputs missing from the
+    source take the batch defaults and must be optional.
+    """
+    units  = {} if units is None else units
+    rename = {} if rename is None else rename
+    names  = [rename.get(c, c) for c in columns]
+    for c, name in zip(columns, names):
+        if name not in batch.INPUT_NAMES:
+            raise KeyError('Column "%s" does not map to a Plant_FinanceSE input' % c)
+    if len(set(names)) != len(names):
+        raise ValueError('Several columns map to the same Plant_FinanceSE input')
+    missing = [name for name in batch.INPUT_NAMES if name not in names and name not in batch.DEFAULTS]
+    if missing:
+        raise KeyError('Required Plant_FinanceSE inputs missing from the source: %s' % ', '.join(missing))
+
+    scale = np.array([factor(name, units.get(c, FIELDS[name].units)) for c, name in zip(columns, names)])
+    lower = np.array([FIELDS[name].lower for name in names])
+    upper = np.array([FIELDS[name].upper for name in names])
+    defaults = dict((name, batch.DEFAULTS[name]) for name in batch.INPUT_NAMES if name not in names)
+    return Plan(list(columns), names, scale, lower, upper, defaults)
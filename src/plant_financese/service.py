@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import json
+import time
+
+import numpy as np
+
+from plant_financese import batch
+
+# Asynchronous LCOE evaluation service.
+#
+# Small concurrent queries (single plants, what-ifs) are collected for at most
+# max_delay seconds or max_batch requests, evaluated together with
+# batch.evaluate and answered through one future per request.  serve() exposes
+# the evaluator over a minimal HTTP/1.1 endpoint on localhost:
+#
+#     POST /lcoe      body: one case or a list of cases (JSON objects of PlantFinance params)
+#                     add "jacobian": true to a case to get its partials as well
+#     GET  /metrics   latency percentiles, throughput and batch sizes
+
+
+class Metrics(object):
+    """Rolling latency and throughput statistics of an Evaluator."""
+    def __init__(self, window=10000):
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def record_batch(self, size):
+        self.batch_sizes.append(size)
+
+    def record_request(self, latency, ok=True):
+        self.latencies.append(latency)
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+
+    def snapshot(self):
+        lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+        elapsed = time.perf_counter() - self.started
+        return {'requests'        : self.requests,
+                'errors'          : self.errors,
+                'batches'         : len(self.batch_sizes),
+                'mean_batch_size' : float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+                'p50_ms'          : float(np.percentile(lat, 50)) * 1.e003,
+                'p99_ms'          : float(np.percentile(lat, 99)) * 1.e003,
+                'throughput_rps'  : self.requests / elapsed if elapsed > 0 else 0.0}
+
+
+class Evaluator(object):
+    """Micro-batching front end to batch.evaluate for use inside an event loop."""
+    def __init__(self, max_batch=1024, max_delay=0.002):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics = Metrics()
+        self._queue = None
+        self._worker = None
+        self._collecting = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop the worker; requests not evaluated yet fail with RuntimeError."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        pending, self._collecting = self._collecting, []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for p in pending:
+            self._resolve(p, error=RuntimeError('Plant_FinanceSE evaluator stopped'))
+
+    async def submit(self, case, jacobian=False):
+        """Evaluate one case (mapping of PlantFinance params) and return its result dict."""
+        if self._worker is None or self._worker.done():
+            # not started yet, or the worker died on an unexpected error
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((dict(case), jacobian, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        # kept on self, so that stop() can fail the requests of a partial batch
+        self._collecting = pending = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_delay
+        while len(pending) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self._collecting = []
+        return pending
+
+    async def _run(self):
+        while True:
+            pending = await self._collect()
+            self.metrics.record_batch(len(pending))
+            self._evaluate(pending)
+            # let the resolved requests run before the next batch is collected
+            await asyncio.sleep(0)
+
+    def _evaluate(self, pending):
+        jacobian = any(p[1] for p in pending)
+        try:
+            out = evaluate_cases([p[0] for p in pending], jacobian)
+        except Exception:
+            # isolate the bad request(s) instead of failing the whole batch
+            for p in pending:
+                self._evaluate_one(p)
+            return
+        for i, p in enumerate(pending):
+            self._resolve(p, result_for(out, i, p[1]))
+
+    def _evaluate_one(self, p):
+        try:
+            out = evaluate_cases([p[0]], p[1])
+        except Exception as e:
+            self._resolve(p, error=e)
+        else:
+            self._resolve(p, result_for(out, 0, p[1]))
+
+    def _resolve(self, p, result=None, error=None):
+        future = p[2]
+        self.metrics.record_request(time.perf_counter() - p[3], ok=error is None)
+        if future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+def evaluate_cases(cases, jacobian):
+    """Stack a list of case mappings into columns and evaluate them together."""
+    names = set()
+    for case in cases:
+        names.update(case)
+    unknown = names.difference(batch.INPUT_NAMES)
+    if unknown:
+        raise KeyError('Unknown Plant_FinanceSE inputs: %s' % ', '.join(sorted(unknown)))
+    cols = {}
+    for name in names:
+        default = batch.DEFAULTS.get(name, np.nan)
+        cols[name] = np.array([float(case.get(name, default)) for case in cases])
+        if np.any(np.isnan(cols[name])):
+            raise KeyError('Plant_FinanceSE batch input "%s" is required' % name)
+    return batch.evaluate(cols, jacobian=jacobian)
+
+
+def result_for(out, i, jacobian):
+    result = {'lcoe': float(out['lcoe'][i])}
+    if jacobian:
+        result['jacobian'] = dict((wrt, float(out['lcoe', wrt][i])) for _, wrt in batch.JACOBIAN_KEYS)
+    return result
+
+
+async def _handle(evaluator, reader, writer):
+    status, body = 200, None
+    try:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        data = await reader.readexactly(int(headers.get('content-length', 0)))
+        method, path = request_line[0], request_line[1]
+
+        if method == 'GET' and path == '/metrics':
+            body = evaluator.metrics.snapshot()
+        elif method == 'POST' and path == '/lcoe':
+            payload = json.loads(data.decode('utf-8'))
+            cases = payload if isinstance(payload, list) else [payload]
+            if not all(isinstance(case, dict) for case in cases):
+                raise TypeError('Cases must be JSON objects of Plant_FinanceSE params')
+            jobs = []
+            for case in cases:
+                case = dict(case)
+                jacobian = bool(case.pop('jacobian', False))
+                jobs.append(evaluator.submit(case, jacobian))
+            results = await asyncio.gather(*jobs, return_exceptions=True)
+            results = [{'error': str(r)} if isinstance(r, Exception) else r for r in results]
+            body = results if isinstance(payload, list) else results[0]
+            if not isinstance(payload, list) and 'error' in body:
+                status = 400
+        else:
+            status, body = 404, {'error': 'not found'}
+    except (ValueError, TypeError, IndexError, asyncio.IncompleteReadError) as e:
+        status, body = 400, {'error': str(e)}
+
+    data = json.dumps(body).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}[status]
+    writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n'
+                  % (status, reason, len(data))).encode('latin-1') + data)
+    await writer.drain()
+    writer.close()
+
+
+async def serve(evaluator=None, host='127.0.0.1', port=0):
+    """Start the HTTP endpoint; returns (server, evaluator).  port=0 picks a free port."""
+    evaluator = Evaluator() if evaluator is None else evaluator
+    await evaluator.start()
+    server = await asyncio.start_server(lambda r, w: _handle(evaluator, r, w), host, port)
+    return server, evaluator
+
+
+async def request(host, port, method, path, body=None):
+    """Minimal HTTP client for the service; returns (status, decoded JSON body)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    data = b'' if body is None else json.dumps(body).encode('utf-8')
+    writer.write(('%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                  % (method, path, host, len(data))).encode('latin-1') + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        key, _, value = line.partition(':')
+        if key.strip().lower() == 'content-length':
+            length = int(value)
+    payload = json.loads((await reader.readexactly(length)).decode('utf-8'))
+    writer.close()
+    return status, payload
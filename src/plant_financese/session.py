@@ -0,0 +1,198 @@
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from plant_financese import batch, cache
+
+# Resumable evaluation sessions for long optimizations and sweeps.
+#
+# A Session journals every newly evaluated case (inputs, lcoe, intermediates
+# and Jacobian) and every driver state snapshot to an append-only log.  On
+# restart the log is replayed: evaluated cases are served from memory (and
+# copied into an EvaluationCache if one is given) and the last driver state is
+# handed back to the driver, so a resumed run repeats no work.  The log is
+# compacted (duplicate cases dropped, only the last state kept) every
+# compact_every records.
+#
+# Record layout: 4-byte magic, 1-byte kind, 8-byte payload length, 4-byte
+# CRC32 of the payload, payload.  A record cut short by a crash fails its
+# length or CRC check; it and everything after it is discarded on replay.
+
+MAGIC = b'PFSE'
+HEADER = struct.Struct('<4sBQI')
+CASES, STATE = 1, 2
+
+N_INPUTS = len(batch.INPUT_NAMES)
+N_VALUES = len(cache.VALUE_NAMES)
+
+
+def _record(kind, payload):
+    return HEADER.pack(MAGIC, kind, len(payload), zlib.crc32(payload) & 0xffffffff) + payload
+
+
+def _cases_payload(inputs, values):
+    return struct.pack('<Q', inputs.shape[0]) + inputs.astype('<f8').tobytes() + values.astype('<f8').tobytes()
+
+
+def read_journal(path):
+    """Return the (kind, payload) of every intact record and the offset where they end."""
+    records = []
+    end = 0
+    if not os.path.exists(path):
+        return records, end
+    with open(path, 'rb') as f:
+        data = f.read()
+    while end + HEADER.size <= len(data):
+        magic, kind, length, crc = HEADER.unpack_from(data, end)
+        start = end + HEADER.size
+        payload = data[start:start + length]
+        if magic != MAGIC or len(payload) != length or zlib.crc32(payload) & 0xffffffff != crc:
+            break
+        records.append((kind, payload))
+        end = start + length
+    return records, end
+
+
+class Session(object):
+    """Journaled evaluation of PlantFinance cases plus driver state.
+
+    evaluate() has the interface of cache.EvaluationCache.evaluate.  state is
+    the last dict passed to save_state (None for a new session).  cache, if
+    given, is warmed with every journaled case on open and kept up to date.
+    A journal written with another MODEL_VERSION is discarded on open.
+    """
+    def __init__(self, path, cache=None, compact_every=1000, version=cache.MODEL_VERSION):
+        self.path = path
+        self.cache = cache
+        self.compact_every = compact_every
+        self.version = version
+        self.state = None
+        self.hits = 0
+        self.misses = 0
+        self._cases = {}
+        self._records = 0
+        self._replay()
+        self._file = open(self.path, 'ab')
+
+    def _replay(self):
+        records, end = read_journal(self.path)
+        if os.path.exists(self.path) and os.path.getsize(self.path) != end:
+            # drop the torn tail left by a crash
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        version = None
+        for kind, payload in records:
+            if kind == STATE:
+                entry = json.loads(payload.decode('utf-8'))
+                version, self.state = entry['version'], entry['state']
+            elif kind == CASES and version == self.version:
+                n = struct.unpack_from('<Q', payload)[0]
+                inputs = np.frombuffer(payload, dtype='<f8', count=n * N_INPUTS, offset=8).reshape(n, N_INPUTS)
+                values = np.frombuffer(payload, dtype='<f8', count=n * N_VALUES, offset=8 + 8 * n * N_INPUTS).reshape(n, N_VALUES)
+                cols = dict((name, inputs[:, j]) for j, name in enumerate(batch.INPUT_NAMES))
+                for key, row, value in zip(cache.case_keys(cols), inputs, values):
+                    self._cases[key] = (row, value)
+        if version != self.version:
+            # a new session, or one journaled with another finance formulation: its cases are stale
+            self._cases = {}
+            self.state = None
+            with open(self.path, 'wb') as f:
+                f.write(_record(STATE, self._state_payload()))
+            records = []
+        self._records = len(records)
+        if self.cache is not None and self._cases:
+            self.cache.store(list(self._cases), np.array([value for _, value in self._cases.values()]))
+
+    def _state_payload(self):
+        return json.dumps({'version': self.version, 'state': self.state}).encode('utf-8')
+
+    def __len__(self):
+        return len(self._cases)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _append(self, record):
+        self._file.write(record)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._records += 1
+        if self._records >= self.compact_every:
+            self.compact()
+
+    def save_state(self, state):
+        """Journal a JSON-serializable driver state."""
+        self.state = state
+        self._append(_record(STATE, self._state_payload()))
+
+    def compact(self):
+        """Rewrite the journal with one record of all cases and the last state."""
+        self._file.close()
+        tmp = self.path + '.compact'
+        with open(tmp, 'wb') as f:
+            # the version travels in the state record, which must come first
+            f.write(_record(STATE, self._state_payload()))
+            if self._cases:
+                inputs = np.array([row for row, _ in self._cases.values()])
+                values = np.array([value for _, value in self._cases.values()])
+                f.write(_record(CASES, _cases_payload(inputs, values)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._records = 2
+        self._file = open(self.path, 'ab')
+
+    def evaluate(self, inputs):
+        """batch.evaluate(inputs, jacobian=True, intermediates=True), skipping journaled cases."""
+        cols = batch.as_columns(inputs)
+        keys = cache.case_keys(cols)
+        values = np.empty((len(keys), N_VALUES))
+        missing = []
+        for i, key in enumerate(keys):
+            case = self._cases.get(key)
+            if case is None:
+                missing.append(i)
+            else:
+                values[i] = case[1]
+        self.hits += len(keys) - len(missing)
+
+        if missing and self.cache is not None:
+            found = self.cache.lookup([keys[i] for i in missing])
+            self.hits += len(found)
+            still = []
+            for i in missing:
+                if keys[i] in found:
+                    values[i] = found[keys[i]]
+                else:
+                    still.append(i)
+            missing = still
+
+        if missing:
+            self.misses += len(missing)
+            index = np.array(missing)
+            sub = dict((name, cols[name][index]) for name in batch.INPUT_NAMES)
+            out = batch.evaluate(sub, jacobian=True, intermediates=True)
+            values[index] = np.column_stack([out[name] for name in cache.VALUE_NAMES])
+            # journal each distinct new case once
+            new = {}
+            for i in missing:
+                new.setdefault(keys[i], i)
+            rows = np.array(list(new.values()))
+            table = np.column_stack([cols[name][rows] for name in batch.INPUT_NAMES])
+            for key, row, value in zip(new, table, values[rows]):
+                self._cases[key] = (row, value)
+            self._append(_record(CASES, _cases_payload(table, values[rows])))
+            if self.cache is not None:
+                self.cache.store(list(new), values[rows])
+
+        return dict((name, values[:, j]) for j, name in enumerate(cache.VALUE_NAMES))
@@ -0,0 +1,66 @@
+import numpy as np
+
+from plant_financese import batch
+
+# Plant sizing over the integer number of turbines.
+#
+# turbine_number is a discrete, pass-by-object param of PlantFinance, so the
+# continuous derivative in its Jacobian entry is of little use to a sizing
+# study.  enumerate_turbine_number evaluates every count in a range for every
+# candidate turbine design in one batch and returns the exact differences
+# between adjacent counts instead.
+
+
+# Step of the central differences of the inputs given as functions of the count
+STEP = 1.e-004
+
+
+class SizingResult(object):
+    def __init__(self, counts, out, relaxed_derivative):
+        self.counts = counts
+        self.lcoe   = out['lcoe']                            # (designs, counts)
+        # exact change of lcoe from one count to the next, lcoe[:, k+1] - lcoe[:, k]
+        self.delta  = np.diff(self.lcoe, axis=1)
+        # d(lcoe)/dn of the model relaxed to a continuous count, including the
+        # dependence of the inputs given as functions of the count, for comparison
+        self.relaxed_derivative = relaxed_derivative
+        best = np.argmin(self.lcoe, axis=1)
+        self.best_index = best
+        self.best_count = counts[best]
+        self.best_lcoe  = self.lcoe[np.arange(self.lcoe.shape[0]), best]
+        self.capital_cost = out['capital_cost']
+
+
+def enumerate_turbine_number(inputs, n_max, n_min=1):
+    """LCOE of every turbine count n_min..n_max for every design in inputs.
+
+    inputs maps the PlantFinance params other than turbine_number to scalars or
+    arrays of candidate designs (shape (d,)).  Any input may also be a function
+    of the counts, called with an array of shape (1, N), to model effects such
+    as wake losses growing with the size of the plant, e.g.
+    wake_loss_factor=lambda n: 0.08 + 0.0004*n.
+    Returns a SizingResult with arrays of shape (d, N).
+    """
+    if 'turbine_number' in inputs:
+        raise ValueError('turbine_number is enumerated and must not be given as an input')
+    if n_min < 1 or n_max < n_min:
+        raise ValueError('Turbine counts must satisfy 1 <= n_min <= n_max')
+    counts = np.arange(n_min, n_max + 1)
+    n = counts[None, :].astype(np.float64)
+    grid = {'turbine_number': n}
+    slopes = {}
+    for name, value in inputs.items():
+        if callable(value):
+            grid[name] = np.asarray(value(n), dtype=np.float64)
+            # chain rule term of the relaxed derivative, by central difference
+            slopes[name] = (np.asarray(value(n + STEP), dtype=np.float64) - np.asarray(value(n - STEP), dtype=np.float64)) / (2 * STEP)
+        else:
+            value = np.asarray(value, dtype=np.float64)
+            grid[name] = value[:, None] if value.ndim == 1 else value
+    cols = batch.as_columns(grid)
+    out = batch.evaluate(cols, jacobian=True, intermediates=True)
+    grad = batch.input_gradients(cols, out)
+    relaxed = grad['turbine_number']
+    for name, slope in slopes.items():
+        relaxed = relaxed + grad[name] * slope
+    return SizingResult(counts, out, relaxed)
@@ -0,0 +1,121 @@
+import numpy as np
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+from plant_financese.bench import peak_alloc, random_cases
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.params = {}
+        self.params['machine_rating']    = 2.32 * 1.e+003
+        self.params['tcc_per_kW']        = 1093.
+        self.params['turbine_number']    = 87.
+        self.params['opex_per_kW']       = 43.56
+        self.params['fixed_charge_rate'] = 0.079216644
+        self.params['bos_per_kW']        = 517.
+        self.params['wake_loss_factor']  = 0.15
+        self.params['turbine_aep']       = 9915.95 * 1.e+003
+
+    def lcoe(self, **kw):
+        p = dict(self.params)
+        p.update(kw)
+        return batch.evaluate(p, jacobian=False)['lcoe'][0]
+
+    def testRun(self):
+        out = batch.evaluate(self.params, intermediates=True)
+        nec  = 9915.95e3 * 0.85 / 2320.
+        lcoe = ((1093. + 517.) * 0.079216644 + 43.56) / nec
+        npt.assert_almost_equal(out['lcoe'][0], lcoe)
+        npt.assert_almost_equal(out['nec'][0], nec)
+        npt.assert_almost_equal(out['capital_cost'][0], (1093. + 517.) * 87. * 2320.)
+
+    def testParkAEP(self):
+        park = 87. * 9915.95e3 * 0.85
+        npt.assert_almost_equal(self.lcoe(park_aep=park, turbine_aep=0.0), self.lcoe())
+
+    def testBroadcast(self):
+        ratings = np.linspace(1500., 5000., 7)
+        out = batch.evaluate(dict(self.params, machine_rating=ratings))
+        self.assertEqual(out['lcoe'].shape, (7,))
+        npt.assert_almost_equal(out['lcoe'][3], self.lcoe(machine_rating=ratings[3]))
+        self.assertEqual(out['lcoe', 'machine_rating'].shape, (7,))
+
+    def testDerivatives(self):
+        J = batch.evaluate(self.params)
+        t_rating = self.params['machine_rating']
+        checks = [('tcc_per_kW', J['lcoe', 'turbine_cost'][0] * t_rating),
+                  ('bos_per_kW', J['lcoe', 'turbine_bos_costs'][0] * t_rating),
+                  ('opex_per_kW', J['lcoe', 'turbine_avg_annual_opex'][0] * t_rating),
+                  ('fixed_charge_rate', J['lcoe', 'fixed_charge_rate'][0]),
+                  ('wake_loss_factor', J['lcoe', 'wake_loss_factor'][0]),
+                  ('turbine_aep', J['lcoe', 'turbine_aep'][0]),
+                  ('turbine_number', J['lcoe', 'turbine_number'][0])]
+        for name, analytic in checks:
+            h = 1e-6 * abs(self.params[name])
+            fd = (self.lcoe(**{name: self.params[name] + h}) - self.lcoe(**{name: self.params[name] - h})) / (2*h)
+            npt.assert_allclose(analytic, fd, rtol=1e-6, err_msg=name)
+
+        # The machine_rating partial holds the per-turbine costs fixed, as in PlantFinance
+        def lcoe_rating(r):
+            scale = t_rating / r
+            return self.lcoe(machine_rating=r, tcc_per_kW=self.params['tcc_per_kW']*scale,
+                             bos_per_kW=self.params['bos_per_kW']*scale, opex_per_kW=self.params['opex_per_kW']*scale)
+        h = 1e-6 * t_rating
+        fd = (lcoe_rating(t_rating + h) - lcoe_rating(t_rating - h)) / (2*h)
+        npt.assert_allclose(J['lcoe', 'machine_rating'][0], fd, rtol=1e-6)
+
+    def testInputGradients(self):
+        cols = batch.as_columns(self.params)
+        grad = batch.input_gradients(cols, batch.evaluate(cols))
+        for name in ['machine_rating', 'tcc_per_kW', 'bos_per_kW', 'opex_per_kW', 'turbine_number', 'turbine_aep']:
+            h = 1e-6 * abs(self.params[name])
+            fd = (self.lcoe(**{name: self.params[name] + h}) - self.lcoe(**{name: self.params[name] - h})) / (2*h)
+            npt.assert_allclose(grad[name][0], fd, rtol=1e-6, err_msg=name)
+
+    def testFloat32ErrorBound(self):
+        rng = np.random.default_rng(3)
+        n = 20000
+        cases = {'machine_rating'    : rng.uniform(1500., 5000., n),
+                 'tcc_per_kW'        : rng.uniform(900., 1300., n),
+                 'turbine_number'    : rng.integers(1, 300, n).astype(float),
+                 'bos_per_kW'        : rng.uniform(300., 700., n),
+                 'opex_per_kW'       : rng.uniform(30., 60., n),
+                 'park_aep'          : np.where(rng.random(n) < 0.5, 0.0, rng.uniform(1e8, 5e9, n)),
+                 'turbine_aep'       : rng.uniform(5e6, 2e7, n),
+                 'wake_loss_factor'  : rng.uniform(0.05, 0.2, n),
+                 'fixed_charge_rate' : rng.uniform(0.05, 0.12, n)}
+        ref = batch.evaluate(cases, intermediates=True)
+        out = batch.evaluate(cases, intermediates=True, dtype=np.float32)
+        scale = {('lcoe', 'turbine_number'): np.abs(ref['lcoe'] / cases['turbine_number']),
+                 ('lcoe', 'machine_rating'): np.abs(ref['lcoe'] / cases['machine_rating'])}
+        for k in ref:
+            self.assertEqual(out[k].dtype, np.float32)
+            err = np.abs(out[k].astype(np.float64) - ref[k])
+            self.assertTrue(np.all(err <= batch.FLOAT32_RTOL * scale.get(k, np.abs(ref[k]))), k)
+
+    def testFloat32Memory(self):
+        # several blocks of float64 partials, the last one partial
+        cases = random_cases(8 * batch.CHUNK + 1000, seed=8)
+        peak = {}
+        for dtype in (np.float64, np.float32):
+            cols = batch.as_columns(cases, dtype=dtype)
+            peak[dtype] = peak_alloc(lambda: batch.evaluate(cols, dtype=dtype))
+        self.assertTrue(peak[np.float32] < 0.6 * peak[np.float64])
+        ref = batch.evaluate(cases)
+        out = batch.evaluate(cases, dtype=np.float32)
+        for k, name in [(('lcoe', 'turbine_number'), 'turbine_number'), (('lcoe', 'machine_rating'), 'machine_rating')]:
+            err = np.abs(out[k].astype(np.float64) - ref[k])
+            self.assertTrue(np.all(err <= batch.FLOAT32_RTOL * np.abs(ref['lcoe'] / cases[name])), name)
+
+    def testChecks(self):
+        self.assertRaises(ValueError, batch.evaluate, dict(self.params, turbine_number=[87., 0.]))
+        self.assertRaises(ValueError, batch.evaluate, dict(self.params, turbine_aep=0.0))
+        self.assertRaises(KeyError, batch.evaluate, {'machine_rating': 2320.})
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestBatch))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
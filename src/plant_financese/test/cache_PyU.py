@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import plant_financese.batch as batch
+import plant_financese.cache as cache
+from plant_financese.bench import random_cases
+
+def worker(args):
+    path, seed = args
+    with cache.EvaluationCache(path) as c:
+        return float(np.sum(c.evaluate(overlapping_cases(seed))['lcoe']))
+
+def overlapping_cases(seed):
+    # every worker shares half of its cases with the others
+    cases = random_cases(400, seed=0)
+    own = random_cases(400, seed=seed)
+    for name in cases:
+        cases[name] = np.concatenate([cases[name], own[name]])
+    return cases
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'finance.sqlite')
+        self.cases = random_cases(1000, seed=4)
+
+    def tearDown(self):
+        for c in self.opened:
+            c.close()
+        shutil.rmtree(self.tmpdir)
+
+    def open(self, **kw):
+        c = cache.EvaluationCache(self.path, **kw)
+        self.opened.append(c)
+        return c
+
+    def testHitsAndValues(self):
+        c = self.open()
+        ref = batch.evaluate(self.cases, intermediates=True)
+        out = c.evaluate(self.cases)
+        self.assertEqual((c.hits, c.misses), (0, 1000))
+        out = c.evaluate(self.cases)
+        self.assertEqual((c.hits, c.misses), (1000, 1000))
+        for k in ref:
+            npt.assert_equal(out[k], ref[k])
+        # a fresh process-level handle sees the same entries
+        self.assertEqual(len(self.open()), 1000)
+
+    def testDuplicatesInBatch(self):
+        c = self.open()
+        cases = dict((k, np.concatenate([v, v])) for k, v in self.cases.items())
+        out = c.evaluate(cases)
+        self.assertEqual(len(c), 1000)
+        npt.assert_equal(out['lcoe'][:1000], out['lcoe'][1000:])
+
+    def testEviction(self):
+        c = self.open(max_entries=500, evict_to=0.8)
+        c.evaluate(self.cases)
+        self.assertTrue(len(c) <= 500)
+        self.assertEqual(len(c), 400)
+
+    def testInvalidation(self):
+        self.open().evaluate(self.cases)
+        self.assertEqual(len(self.open()), 1000)
+        self.assertEqual(len(self.open(version='changed formulation')), 0)
+
+    def testEvictionKeepsRecentlyUsed(self):
+        c = self.open(max_entries=1500, evict_to=0.8)
+        c.evaluate(self.cases)
+        first = dict((k, v[:100]) for k, v in self.cases.items())
+        c.evaluate(first)                   # recently used, must survive
+        c.evaluate(random_cases(1000, seed=9))
+        self.assertEqual(len(c), 1200)
+        self.assertEqual(len(c), c.connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0])
+        self.assertEqual(len(c.lookup(cache.case_keys(batch.as_columns(first)))), 100)
+
+    def testLookupDoesNotLock(self):
+        c = self.open()
+        c.evaluate(self.cases)
+        # another process holds the write lock
+        writer = self.open(timeout=0.1)
+        writer.connection().execute('BEGIN IMMEDIATE')
+        try:
+            reader = self.open(timeout=0.1)
+            self.assertEqual(len(reader.lookup(cache.case_keys(batch.as_columns(self.cases)))), 1000)
+        finally:
+            writer.connection().execute('ROLLBACK')
+
+    def testConcurrentProcesses(self):
+        self.open()
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            sums = list(pool.map(worker, [(self.path, s) for s in range(1, 9)]))
+        self.assertEqual(len(self.open()), 400 + 8 * 400)
+        ref = [float(np.sum(batch.evaluate(overlapping_cases(s))['lcoe'])) for s in range(1, 9)]
+        npt.assert_equal(sums, ref)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestCache))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
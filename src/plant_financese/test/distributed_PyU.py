@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+import plant_financese.distributed as dist
+
+def sample_sites(rng, n):
+    return {'machine_rating'   : rng.uniform(1500., 5000., n),
+            'tcc_per_kW'       : rng.uniform(900., 1300., n),
+            'turbine_number'   : rng.integers(10, 200, n).astype(float),
+            'bos_per_kW'       : rng.uniform(300., 700., n),
+            'opex_per_kW'      : rng.uniform(30., 60., n),
+            'turbine_aep'      : rng.uniform(5e6, 2e7, n)}
+
+def flaky_sites(rng, n):
+    # fails on the short last chunk of a sweep while PFSE_TEST_FAIL is set
+    if os.environ.get('PFSE_TEST_FAIL') and n < 500:
+        raise RuntimeError('node failure')
+    return sample_sites(rng, n)
+
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testChunkBounds(self):
+        self.assertEqual(dist.chunk_bounds(10, 4), [(0, 4), (4, 8), (8, 10)])
+
+    def testKahan(self):
+        acc = dist.KahanSum()
+        for x in [1.0, 1e100, 1.0, -1e100]:
+            acc.add(x)
+        self.assertEqual(acc.value, 2.0)
+
+    def testBackendsBitwiseEqual(self):
+        ref = dist.run_sweep(sample_sites, 5000, chunk_size=700, seed=42)
+        for backend in [dist.ProcessPoolBackend(max_workers=3), dist.MPIBackend(size=2)]:
+            res = dist.run_sweep(sample_sites, 5000, chunk_size=700, seed=42, backend=backend)
+            self.assertEqual(res.count, 5000)
+            self.assertEqual(res.lcoe_sum, ref.lcoe_sum)
+            self.assertEqual(res.capital_sum, ref.capital_sum)
+            self.assertEqual(res.lcoe_min, ref.lcoe_min)
+
+    def testSeed(self):
+        a = dist.run_sweep(sample_sites, 1000, chunk_size=300, seed=1)
+        b = dist.run_sweep(sample_sites, 1000, chunk_size=300, seed=2)
+        self.assertNotEqual(a.lcoe_sum, b.lcoe_sum)
+
+    def testCheckpointRestart(self):
+        ckpt = os.path.join(self.tmpdir, 'sweep')
+        ref = dist.run_sweep(sample_sites, 3000, chunk_size=500, seed=7, checkpoint_dir=ckpt)
+        # Simulate a node that died before writing two of its chunks
+        os.remove(os.path.join(ckpt, 'chunk_00000001.json'))
+        os.remove(os.path.join(ckpt, 'chunk_00000004.json'))
+        res = dist.run_sweep(sample_sites, 3000, chunk_size=500, seed=7, checkpoint_dir=ckpt)
+        self.assertEqual(res.lcoe_sum, ref.lcoe_sum)
+        self.assertEqual(res.n_chunks, 6)
+        self.assertRaises(ValueError, dist.run_sweep, sample_sites, 3000, 500, 8, None, ckpt)
+        # a different sampler with the same seed must not reuse the chunks
+        self.assertRaises(ValueError, dist.run_sweep, flaky_sites, 3000, 500, 7, None, ckpt)
+
+    def testCheckpointBeforeGather(self):
+        ckpt = os.path.join(self.tmpdir, 'sweep')
+        ref = dist.run_sweep(flaky_sites, 3100, chunk_size=500, seed=3)
+        os.environ['PFSE_TEST_FAIL'] = '1'
+        try:
+            self.assertRaises(RuntimeError, dist.run_sweep, flaky_sites, 3100, 500, 3, dist.MPIBackend(size=2), ckpt)
+        finally:
+            del os.environ['PFSE_TEST_FAIL']
+        # the failing rank saved the chunks it finished before the failure, although the
+        # gather never happened; the other rank may have been terminated at any point
+        saved = set(f for f in os.listdir(ckpt) if f.startswith('chunk_') and f.endswith('.json'))
+        self.assertTrue(set('chunk_%08d.json' % i for i in [0, 2, 4]) <= saved)
+        self.assertFalse('chunk_00000006.json' in saved)
+        res = dist.run_sweep(flaky_sites, 3100, chunk_size=500, seed=3, backend=dist.MPIBackend(size=2), checkpoint_dir=ckpt)
+        self.assertEqual(res.lcoe_sum, ref.lcoe_sum)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestDistributed))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
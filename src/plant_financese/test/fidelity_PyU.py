@@ -0,0 +1,88 @@
+import numpy as np
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+import plant_financese.fidelity as fid
+from plant_financese.bench import random_cases
+
+class TestFidelity(unittest.TestCase):
+    def setUp(self):
+        self.params = {'machine_rating': 5000., 'tcc_per_kW': 6087803.555 / 50 / 5000., 'turbine_number': 50.,
+                       'opex_per_kW': (401819.023 + 22225.395 + 91048.387) / 50 / 5000.,
+                       'bos_per_kW': 7668775.3 / 50 / 5000., 'park_aep': 15756299.843}
+
+    def testFCR(self):
+        npt.assert_equal(fid.FCRModel().evaluate(self.params), batch.evaluate(self.params)['lcoe'])
+
+    def testAnnuity(self):
+        # same formula as the former nrel_csm_fin lcoe
+        r = 0.07
+        a = (1 + 0.5*((1+r)**1.0 - 1)) * (r/(1-(1+r)**(-20.0)))
+        lcoe = (a*(6087803.555 + 7668775.3) + 401819.023 + 22225.395 + 91048.387)/15756299.843
+        npt.assert_allclose(fid.AnnuityModel().evaluate(self.params), lcoe, rtol=1e-12)
+        npt.assert_allclose(fid.AnnuityModel().evaluate(dict(self.params, discount_rate=0.0, construction_time=0.0)),
+                            ((6087803.555 + 7668775.3)/20. + 401819.023 + 22225.395 + 91048.387)/15756299.843, rtol=1e-12)
+
+    def testCashFlow(self):
+        # without taxes, degradation or construction the cash flow model reduces to the annuity
+        p = dict(self.params, construction_time=0.0)
+        npt.assert_allclose(fid.CashFlowModel().evaluate(p), fid.AnnuityModel().evaluate(p), rtol=1e-12)
+        # faster depreciation lowers the lcoe
+        base = fid.CashFlowModel().evaluate(dict(p, tax_rate=0.3, depreciation_years=5.0))
+        self.assertTrue(np.all(base < fid.CashFlowModel().evaluate(dict(p, tax_rate=0.3, depreciation_years=20.0))))
+        self.assertTrue(np.all(fid.CashFlowModel().evaluate(dict(p, degradation=0.01)) > fid.CashFlowModel().evaluate(p)))
+        # two years of construction cost more than one
+        self.assertTrue(np.all(fid.CashFlowModel().evaluate(dict(p, construction_time=2.0)) >
+                               fid.CashFlowModel().evaluate(dict(p, construction_time=1.0))))
+
+    def testConstructionFinancing(self):
+        # spending at the start of construction year k compounds over the Tc-(k-1) years to operation
+        r = 0.07
+        crf = r/(1-(1+r)**(-20.0))
+        for Tc, build in [(0.5, 1.07**0.5), (1.0, 1.07), (1.5, (1.07**1.5 + 0.5*1.07**0.5)/1.5)]:
+            lcoe = (build*crf*(6087803.555 + 7668775.3) + 401819.023 + 22225.395 + 91048.387)/15756299.843
+            npt.assert_allclose(fid.CashFlowModel().evaluate(dict(self.params, construction_time=Tc)), lcoe,
+                                rtol=1e-12, err_msg=str(Tc))
+
+    def testFinanceSweep(self):
+        # scalar plant inputs, only the finance inputs vary
+        rates = np.linspace(0.05, 0.09, 50)
+        sweep = dict(self.params, discount_rate=rates, construction_time=1.5)
+        for model in fid.MODELS:
+            lcoe = model.evaluate(sweep)
+            self.assertEqual(lcoe.shape, (50,), model.name)
+            for i in [0, 17, 49]:
+                npt.assert_allclose(lcoe[i], model.evaluate(dict(sweep, discount_rate=rates[i]))[0], rtol=1e-14)
+        exact = fid.CashFlowModel().evaluate(sweep)
+        threshold = np.median(exact)
+        res = fid.screen(sweep, threshold, pilot=10)
+        self.assertEqual(res.lcoe.shape, (50,))
+        npt.assert_equal(res.below, exact < threshold)
+
+    def testScreen(self):
+        n = 20000
+        cases = random_cases(n, seed=2)
+        del cases['fixed_charge_rate']
+        rng = np.random.default_rng(1)
+        cases['discount_rate'] = rng.uniform(0.06, 0.08, n)
+        cases['tax_rate'] = 0.25
+        cases['degradation'] = 0.005
+        exact = fid.CashFlowModel().evaluate(cases)
+        threshold = np.median(exact)
+        res = fid.screen(cases, threshold, pilot=500)
+        self.assertEqual(res.evaluations[0], n + 500)
+        self.assertTrue(res.evaluations[1] < n / 2)
+        self.assertTrue(res.evaluations[-1] < n / 4)
+        self.assertTrue(res.bounds[0] >= res.bounds[-1] == 0.0)
+        npt.assert_equal(res.below, exact < threshold)
+        npt.assert_allclose(res.lcoe[res.level == 2], exact[res.level == 2], rtol=1e-12)
+        bound = np.array(res.bounds)[res.level]
+        self.assertTrue(np.all(np.abs(res.lcoe - exact) <= bound * np.abs(res.lcoe) + 1e-15))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestFidelity))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
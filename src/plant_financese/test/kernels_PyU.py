@@ -0,0 +1,138 @@
+import numpy as np
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+import plant_financese.kernels as kernels
+from plant_financese.bench import random_cases
+
+class TestKernels(unittest.TestCase):
+    def setUp(self):
+        self.cases = random_cases(5000, seed=11)
+        self.cases['park_aep'] = np.where(np.arange(5000) % 3 == 0, 1.2e9, 0.0)
+        self.ref = batch.evaluate(self.cases)
+
+    def check(self, backend):
+        out = kernels.evaluate(self.cases, backend=backend)
+        for k in self.ref:
+            scale = np.abs(self.ref['lcoe'] / self.cases['machine_rating']) if k == ('lcoe', 'machine_rating') else np.abs(self.ref[k])
+            npt.assert_array_less(np.abs(out[k] - self.ref[k]), 1e-12 * scale + 1e-300, err_msg=str(k))
+
+    def testNumpy(self):
+        self.check('numpy')
+
+    @unittest.skipUnless(kernels.HAVE_NUMBA, 'numba is not installed')
+    def testNumba(self):
+        self.check('numba')
+
+    def testEvaluateInto(self):
+        cols = kernels.input_columns(self.cases)
+        out = kernels.Outputs(5000)
+        kernels.evaluate_into(cols, out.lcoe, out.jac)
+        npt.assert_allclose(out.lcoe, self.ref['lcoe'], rtol=1e-14)
+        npt.assert_allclose(out['lcoe', 'turbine_aep'], self.ref['lcoe', 'turbine_aep'], rtol=1e-14)
+        out = kernels.Outputs(5000, jacobian=False)
+        kernels.evaluate_into(cols, out.lcoe)
+        npt.assert_allclose(out.lcoe, self.ref['lcoe'], rtol=1e-14)
+
+    def testIntermediates(self):
+        ref = batch.evaluate(self.cases, jacobian=False, intermediates=True)
+        for backend in ['numpy'] + (['numba'] if kernels.HAVE_NUMBA else []):
+            out = kernels.evaluate(self.cases, intermediates=True, backend=backend)
+            for name in batch.INTERMEDIATE_NAMES:
+                npt.assert_allclose(out[name], ref[name], rtol=1e-14, err_msg=name)
+
+    def testInputLayouts(self):
+        n = 5000
+        rec = np.zeros(n, dtype=[(name, np.float64) for name in batch.INPUT_NAMES])
+        table = np.zeros((n, len(batch.INPUT_NAMES)))
+        for j, name in enumerate(batch.INPUT_NAMES):
+            rec[name] = self.cases.get(name, batch.DEFAULTS.get(name))
+            table[:, j] = rec[name]
+        for inputs in [rec, table, memoryview(table)]:
+            cols = kernels.input_columns(inputs)
+            self.assertTrue(np.shares_memory(cols['machine_rating'], inputs))
+            npt.assert_allclose(kernels.evaluate(inputs).lcoe, self.ref['lcoe'], rtol=1e-14)
+        self.assertRaises(ValueError, kernels.input_columns, np.zeros((n, 4)))
+
+    def testReuseOutputs(self):
+        out = kernels.Outputs(5000, intermediates=True)
+        self.assertTrue(kernels.evaluate(self.cases, out=out) is out)
+        lcoe = out.lcoe
+        kernels.evaluate(dict(self.cases, fixed_charge_rate=0.1), out=out)
+        self.assertTrue(out.lcoe is lcoe)
+        npt.assert_allclose(out.lcoe, batch.evaluate(dict(self.cases, fixed_charge_rate=0.1))['lcoe'], rtol=1e-14)
+        self.assertRaises(ValueError, kernels.evaluate, self.cases, kernels.Outputs(10))
+
+    def testLazyEvaluator(self):
+        lazy = kernels.LazyEvaluator(5000)
+        lazy.set_inputs(self.cases)
+        npt.assert_allclose(lazy.lcoe, self.ref['lcoe'], rtol=1e-14)
+        npt.assert_allclose(lazy.lcoe, self.ref['lcoe'], rtol=1e-14)
+        self.assertEqual(lazy.evaluations, {'lcoe': 1, 'jacobian': 0, 'intermediates': 0})
+        # same point again: nothing is recomputed
+        lazy.set_inputs(self.cases)
+        npt.assert_allclose(lazy.jacobian()['lcoe', 'park_aep'], self.ref['lcoe', 'park_aep'], rtol=1e-14)
+        lazy.jacobian()
+        lazy.lcoe
+        self.assertEqual(lazy.evaluations, {'lcoe': 1, 'jacobian': 1, 'intermediates': 0})
+        # a new point invalidates everything
+        lazy.set_inputs(dict(self.cases, fixed_charge_rate=0.1))
+        ref = batch.evaluate(dict(self.cases, fixed_charge_rate=0.1), intermediates=True)
+        npt.assert_allclose(lazy.intermediates()['nec'], ref['nec'], rtol=1e-14)
+        npt.assert_allclose(lazy.lcoe, ref['lcoe'], rtol=1e-14)
+        self.assertEqual(lazy.evaluations, {'lcoe': 2, 'jacobian': 1, 'intermediates': 1})
+        self.assertRaises(ValueError, lazy.set_inputs, random_cases(10))
+        lazy.set_inputs(dict(self.cases, turbine_number=0.0))
+        self.assertRaises(ValueError, lambda: lazy.lcoe)
+
+    def testLcoeReuse(self):
+        cols = kernels.input_columns(self.cases)
+        for backend in ['numpy'] + (['numba'] if kernels.HAVE_NUMBA else []):
+            out = kernels.Outputs(5000, intermediates=True)
+            # a deliberately scaled lcoe shows that the buffer is read, not recomputed
+            out.lcoe[:] = 2 * self.ref['lcoe']
+            kernels.evaluate_into(cols, out.lcoe, out.jac, out.inter, backend=backend, lcoe_valid=True)
+            npt.assert_equal(out.lcoe, 2 * self.ref['lcoe'])
+            npt.assert_allclose(out['lcoe', 'fixed_charge_rate'], self.ref['lcoe', 'fixed_charge_rate'], rtol=1e-14, err_msg=backend)
+            npt.assert_allclose(out['lcoe', 'turbine_aep'], 2 * self.ref['lcoe', 'turbine_aep'], rtol=1e-14, err_msg=backend)
+
+    def testScalarEvaluator(self):
+        ref = batch.evaluate(self.cases, intermediates=True)
+        point = kernels.ScalarEvaluator()
+        for i in range(0, 5000, 97):
+            point.set_inputs([float(self.cases[name][i]) for name in batch.INPUT_NAMES])
+            # same operations as batch.evaluate, so the same bits
+            self.assertEqual(point.lcoe, ref['lcoe'][i])
+            for k, v in point.jacobian().items():
+                self.assertEqual(v, ref[k][i], str(k))
+            for k, v in point.intermediates().items():
+                self.assertEqual(v, ref[k][i], k)
+        n = len(range(0, 5000, 97))
+        self.assertEqual(point.evaluations, {'lcoe': n, 'jacobian': n, 'intermediates': n})
+        # same point again: nothing is recomputed
+        point.set_inputs(list(point.x))
+        point.lcoe, point.jacobian(), point.intermediates()
+        self.assertEqual(point.evaluations, {'lcoe': n, 'jacobian': n, 'intermediates': n})
+
+    def testBufferShapes(self):
+        cols = kernels.input_columns(random_cases(1000))
+        for backend in ['numpy'] + (['numba'] if kernels.HAVE_NUMBA else []):
+            out = kernels.Outputs(5000, intermediates=True)
+            self.assertRaises(ValueError, kernels.evaluate_into, cols, out.lcoe, backend=backend)
+            out = kernels.Outputs(1000, intermediates=True)
+            self.assertRaises(ValueError, kernels.evaluate_into, cols, out.lcoe, np.empty((9, 5000)), backend=backend)
+            self.assertRaises(ValueError, kernels.evaluate_into, cols, out.lcoe, out.jac, np.empty((8, 1000)), backend=backend)
+            self.assertRaises(ValueError, kernels.evaluate_into, dict(cols, fixed_charge_rate=np.ones(5000)), out.lcoe,
+                              backend=backend)
+            kernels.evaluate_into(cols, out.lcoe, out.jac, out.inter, backend=backend)
+
+    def testBackendErrors(self):
+        self.assertRaises(ValueError, kernels.evaluate, self.cases, backend='fortran')
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestKernels))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
@@ -0,0 +1,88 @@
+import numpy as np
+import numpy.testing as npt
+import unittest
+import plant_financese.pareto as pareto
+
+def brute_force_mask(F):
+    n = F.shape[0]
+    mask = np.ones(n, dtype=bool)
+    for i in range(n):
+        for j in range(n):
+            if i != j and np.all(F[j] <= F[i]) and (np.any(F[j] < F[i]) or j < i):
+                mask[i] = False
+                break
+    return mask
+
+class TestPareto(unittest.TestCase):
+    def setUp(self):
+        self.fixed = {'tcc_per_kW': 1093., 'bos_per_kW': 517., 'opex_per_kW': 43.56,
+                      'turbine_aep': 9915.95e3, 'wake_loss_factor': 0.15}
+
+    def testParetoMask(self):
+        rng = np.random.default_rng(0)
+        for m in [1, 2, 3, 4]:
+            F = np.round(rng.random((400, m)) * 20)   # rounding creates ties and duplicates
+            npt.assert_equal(pareto.pareto_mask(F), brute_force_mask(F), err_msg=str(m))
+
+    def testParetoMaskLarge(self):
+        rng = np.random.default_rng(1)
+        F = rng.random((200000, 3))
+        mask = pareto.pareto_mask(F)
+        front = F[mask]
+        sample = F[rng.choice(200000, 2000, replace=False)]
+        # no front point is dominated by a sample point
+        dominated = np.any(np.all(sample[None, :, :] < front[:, None, :], axis=2), axis=1)
+        self.assertFalse(np.any(dominated))
+
+    def testNondominatedSort(self):
+        F = np.array([[1., 4.], [2., 2.], [4., 1.], [3., 3.], [2., 2.], [5., 5.]])
+        npt.assert_equal(pareto.nondominated_sort(F), [0, 0, 0, 1, 0, 2])
+
+    def testCrowding(self):
+        F = np.array([[0., 3.], [1., 2.], [2., 1.], [3., 0.]])
+        d = pareto.crowding_distance(F)
+        self.assertTrue(np.isinf(d[0]) and np.isinf(d[3]))
+        npt.assert_allclose(d[1:3], [4./3, 4./3])
+
+    def testNSGA2(self):
+        design = {'machine_rating': (1500., 5000.), 'turbine_number': (10., 150.)}
+        res = pareto.nsga2(design, self.fixed, objectives=('lcoe', 'capital_cost', 'capacity'),
+                           population=60, generations=20)
+        self.assertEqual(res.evaluations, 60 * 21)
+        self.assertTrue(len(res.X) > 10)
+        npt.assert_equal(res.design['turbine_number'], np.round(res.design['turbine_number']))
+        self.assertTrue(np.all(pareto.pareto_mask(res.F)))
+        # capacity is maximized, so its objective is negative
+        self.assertTrue(np.all(res.F[:, 2] < 0))
+        npt.assert_allclose(res.gradients['capacity']['turbine_number'], -res.design['machine_rating'])
+
+        # gradient of the capital cost against finite differences
+        i = 0
+        x = dict(self.fixed, machine_rating=res.design['machine_rating'][i], turbine_number=res.design['turbine_number'][i])
+        h = 1e-3
+        from plant_financese import batch
+        cols = lambda d: batch.as_columns(d)
+        fd = (pareto.quantities(cols(dict(x, machine_rating=x['machine_rating'] + h)))['capital_cost'] -
+              pareto.quantities(cols(dict(x, machine_rating=x['machine_rating'] - h)))['capital_cost']) / (2*h)
+        npt.assert_allclose(res.gradients['capital_cost']['machine_rating'][i], fd[0], rtol=1e-6)
+
+    def testOddPopulation(self):
+        design = {'machine_rating': (1500., 5000.), 'turbine_number': (10., 150.)}
+        res = pareto.nsga2(design, self.fixed, population=41, generations=5)
+        self.assertEqual(res.evaluations, 41 * 6)
+        self.assertTrue(np.all(pareto.pareto_mask(res.F)))
+
+    def testConstraints(self):
+        design = {'machine_rating': (1500., 5000.), 'turbine_number': (10., 150.)}
+        res = pareto.nsga2(design, self.fixed, objectives=('capital_cost', 'capacity'),
+                           constraints={'capital_cost': (None, 3e8)}, population=40, generations=15)
+        self.assertTrue(np.all(res.F[:, 0] <= 3e8))
+        self.assertTrue(len(res.X) > 0)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestPareto))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
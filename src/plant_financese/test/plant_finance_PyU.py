@@ -1,8 +1,9 @@
-import numpy as np
-import numpy.testing as npt
+import io
+import contextlib
 import unittest
+import plant_financese.batch as batch
 import plant_financese.plant_finance as pf
-from openmdao.api import Problem, Group
+import plant_financese.schema as schema
 
 class TestPlantFinance(unittest.TestCase):
     def setUp(self):
@@ -10,39 +11,80 @@ class TestPlantFinance(unittest.TestCase):
         self.unknowns = {}
         self.resids = {}
 
-        self.params['sea_depth'] = 0.0
-        self.params['turbine_number'] = 50
-        self.params['turbine_cost'] = 1.2e6
-        self.params['bos_costs'] = 7.7e6
-        self.params['avg_annual_opex'] = 7e5
-        self.params['fixed_charge_rate'] = 0.12
-        self.params['tax_rate'] = 0.4
-        self.params['discount_rate'] = 0.07
-        self.params['net_aep'] = 1.6e7
-        self.params['construction_time'] = 1.0
-        self.params['project_lifetime'] = 20.0
-        
+        self.params['machine_rating']       = 2.32 * 1.e+003
+        self.params['tcc_per_kW']           = 1093.
+        self.params['turbine_number']       = 87
+        self.params['bos_per_kW']           = 517.
+        self.params['opex_per_kW']          = 43.56
+        self.params['park_aep']             = 0.0
+        self.params['turbine_aep']          = 9915.95 * 1.e+003
+        self.params['wake_loss_factor']     = 0.15
+        self.params['fixed_charge_rate']    = 0.079216644
+
         self.mypfin = pf.PlantFinance()
 
+    def reference(self, params):
+        return batch.evaluate(dict((k, float(v)) for k, v in params.items()), intermediates=True)
+
     def testRun(self):
         self.mypfin.solve_nonlinear(self.params, self.unknowns, self.resids)
+        self.assertEqual(self.unknowns['lcoe'], self.reference(self.params)['lcoe'][0])
+
+        self.params['park_aep'] = 1.2e9
+        self.mypfin.solve_nonlinear(self.params, self.unknowns, self.resids)
+        self.assertEqual(self.unknowns['lcoe'], self.reference(self.params)['lcoe'][0])
+
+    def testLinearize(self):
+        self.mypfin.solve_nonlinear(self.params, self.unknowns, self.resids)
+        J = self.mypfin.linearize(self.params, self.unknowns, self.resids)
+        ref = self.reference(self.params)
+        self.assertEqual(sorted(J), sorted(batch.JACOBIAN_KEYS))
+        for key in batch.JACOBIAN_KEYS:
+            self.assertEqual(J[key], ref[key][0], str(key))
+
+        # params changed since the last solve_nonlinear
+        self.params['wake_loss_factor'] = 0.1
+        J = self.mypfin.linearize(self.params, self.unknowns, self.resids)
+        ref = self.reference(self.params)
+        for key in batch.JACOBIAN_KEYS:
+            self.assertEqual(J[key], ref[key][0], str(key))
+
+    def testLazy(self):
+        self.mypfin.solve_nonlinear(self.params, self.unknowns, self.resids)
+        self.mypfin.linearize(self.params, self.unknowns, self.resids)
+        self.assertEqual(self.mypfin._point.evaluations, {'lcoe': 1, 'jacobian': 1, 'intermediates': 0})
+
+        verbose = pf.PlantFinance(verbosity=True)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            verbose.solve_nonlinear(self.params, self.unknowns, self.resids)
+        verbose.linearize(self.params, self.unknowns, self.resids)
+        self.assertEqual(verbose._point.evaluations, {'lcoe': 1, 'jacobian': 1, 'intermediates': 1})
+        self.assertTrue('%.2f USD/MWh' % (self.unknowns['lcoe'] * 1.e003) in out.getvalue())
+
+    def testParamMetadata(self):
+        params = self.mypfin._init_params_dict
+        self.assertEqual(sorted(params), sorted(batch.INPUT_NAMES))
+        for field in schema.INPUTS:
+            meta = params[field.name]
+            self.assertEqual(meta['val'], field.default, field.name)
+            self.assertEqual(meta.get('units'), field.units, field.name)
+            self.assertEqual(meta['desc'], field.desc, field.name)
+        self.assertTrue(params['turbine_number']['pass_by_obj'])
+        self.assertEqual(self.mypfin._init_unknowns_dict['lcoe']['units'], 'USD/kW/h')
+
+    def testRelaxedTurbineNumber(self):
+        relaxed = pf.PlantFinance(relax_turbine_number=True)
+        meta = relaxed._init_params_dict['turbine_number']
+        self.assertFalse(meta.get('pass_by_obj', False))
+        self.assertTrue(isinstance(meta['val'], float))
+
+        self.params['turbine_number'] = 86.5
+        relaxed.solve_nonlinear(self.params, self.unknowns, self.resids)
+        J = relaxed.linearize(self.params, self.unknowns, self.resids)
+        ref = self.reference(self.params)
+        self.assertEqual(self.unknowns['lcoe'], ref['lcoe'][0])
+        self.assertEqual(J['lcoe', 'turbine_number'], ref['lcoe', 'turbine_number'][0])
 
-        r = 0.07
-        a = (1 + 0.5*((1+r)**1.0 - 1)) * (r/(1-(1+r)**(-20.0)))
-        coe = (0.12*(50*1.2e6+7.7e6) + 0.6*7e5)/1.6e7
-        lcoe = (a*(50*1.2e6+7.7e6) + 7e5)/1.6e7
-        self.assertEqual(self.unknowns['coe'], coe)
-        self.assertEqual(self.unknowns['lcoe'], lcoe)
-
-
-    def testDerivatives(self):
-        prob = Problem(root=Group())
-        root = prob.root
-        root.add('pf', pf.PlantFinance(), promotes=['*'])
-        prob.setup()
-        for k in self.params.keys(): prob[k] = self.params[k]        
-        prob.check_total_derivatives()
-        
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestPlantFinance))
@@ -50,5 +92,3 @@ def suite():
 
 if __name__ == '__main__':
     unittest.TextTestRunner().run(suite())
-    
-    
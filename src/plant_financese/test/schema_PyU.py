@@ -0,0 +1,60 @@
+import numpy as np
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+import plant_financese.schema as schema
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.data = {'rating_MW'   : np.array([2.32, 3.0, 4.2]),
+                     'tcc'         : np.array([1093., 1100., 1050.]),
+                     'n'           : np.array([87., 50., 30.]),
+                     'bos'         : np.array([517., 520., 600.]),
+                     'opex'        : np.array([43.56, 40., 45.]),
+                     'aep_GWh'     : np.array([9.91595, 12.1, 16.0]),
+                     'wake_pct'    : np.array([15., 12., 10.])}
+        self.plan = schema.compile_plan(list(self.data),
+                                        units={'rating_MW': 'MW', 'aep_GWh': 'GWh', 'wake_pct': '%'},
+                                        rename={'rating_MW': 'machine_rating', 'tcc': 'tcc_per_kW', 'n': 'turbine_number',
+                                                'bos': 'bos_per_kW', 'opex': 'opex_per_kW', 'aep_GWh': 'turbine_aep',
+                                                'wake_pct': 'wake_loss_factor'})
+
+    def testApply(self):
+        inputs, valid = self.plan.apply(self.data)
+        self.assertTrue(np.all(valid))
+        npt.assert_allclose(inputs['machine_rating'], [2320., 3000., 4200.])
+        npt.assert_allclose(inputs['turbine_aep'], [9915.95e3, 12.1e6, 16.0e6])
+        npt.assert_allclose(inputs['wake_loss_factor'], [0.15, 0.12, 0.10])
+        self.assertEqual(inputs['fixed_charge_rate'], batch.DEFAULTS['fixed_charge_rate'])
+        table = np.column_stack([self.data[c] for c in self.plan.columns])
+        npt.assert_equal(self.plan.apply(table)[0]['machine_rating'], inputs['machine_rating'])
+        lcoe = batch.evaluate(inputs)['lcoe']
+        npt.assert_allclose(schema.convert(lcoe[0], 'lcoe', to_units='USD/MWh'), 47.0957, rtol=1e-5)
+
+    def testValidation(self):
+        data = dict(self.data, wake_pct=np.array([15., 120., 10.]), n=np.array([87., 50., 0.]))
+        self.assertRaises(ValueError, self.plan.apply, data)
+        _, valid = self.plan.apply(data, on_invalid='mask')
+        npt.assert_equal(valid, [True, False, False])
+        inputs, _ = self.plan.apply(data, on_invalid='clip')
+        npt.assert_equal(inputs['wake_loss_factor'][1], 1.0)
+        npt.assert_equal(inputs['turbine_number'][2], 1.0)
+
+    def testCompileErrors(self):
+        self.assertRaises(ValueError, schema.compile_plan, ['machine_rating', 'tcc_per_kW', 'turbine_number'],
+                          units={'machine_rating': 'USD'})
+        self.assertRaises(KeyError, schema.compile_plan, ['machine_rating', 'foo'])
+        self.assertRaises(KeyError, schema.compile_plan, ['machine_rating', 'tcc_per_kW'])
+
+    def testSchemaMatchesBatch(self):
+        self.assertEqual(tuple(f.name for f in schema.INPUTS), batch.INPUT_NAMES)
+        for name, value in batch.DEFAULTS.items():
+            self.assertEqual(schema.FIELDS[name].default, value)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestSchema))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
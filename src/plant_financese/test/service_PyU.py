@@ -0,0 +1,105 @@
+import asyncio
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+import plant_financese.service as service
+from plant_financese.bench import random_cases
+
+def case_list(n):
+    cols = random_cases(n, seed=5)
+    return [dict((k, float(v[i])) for k, v in cols.items()) for i in range(n)]
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.cases = case_list(200)
+        self.ref = batch.evaluate(random_cases(200, seed=5))
+
+    def testBatching(self):
+        async def run():
+            ev = service.Evaluator(max_batch=64, max_delay=0.01)
+            results = await asyncio.gather(*[ev.submit(c, jacobian=(i % 2 == 0)) for i, c in enumerate(self.cases)])
+            await ev.stop()
+            return ev, results
+        ev, results = asyncio.run(run())
+        npt.assert_allclose([r['lcoe'] for r in results], self.ref['lcoe'], rtol=1e-14)
+        npt.assert_allclose(results[0]['jacobian']['turbine_aep'], self.ref['lcoe', 'turbine_aep'][0], rtol=1e-14)
+        self.assertFalse('jacobian' in results[1])
+        m = ev.metrics.snapshot()
+        self.assertEqual(m['requests'], 200)
+        self.assertTrue(m['batches'] < 200)
+        self.assertTrue(m['p99_ms'] >= m['p50_ms'])
+
+    def testBadRequestIsolated(self):
+        async def run():
+            ev = service.Evaluator(max_delay=0.01)
+            bad = dict(self.cases[1], turbine_number=0.0)
+            results = await asyncio.gather(ev.submit(self.cases[0]), ev.submit(bad), ev.submit({'foo': 1.0}),
+                                           return_exceptions=True)
+            await ev.stop()
+            return results
+        good, bad, unknown = asyncio.run(run())
+        npt.assert_allclose(good['lcoe'], self.ref['lcoe'][0], rtol=1e-14)
+        self.assertTrue(isinstance(bad, ValueError))
+        self.assertTrue(isinstance(unknown, KeyError))
+
+    def testUnexpectedErrorKeepsServing(self):
+        async def run():
+            ev = service.Evaluator(max_delay=0.01)
+            # float() raises OverflowError for this one
+            huge = dict(self.cases[1], turbine_number=10**400)
+            results = await asyncio.wait_for(asyncio.gather(ev.submit(self.cases[0]), ev.submit(huge),
+                                                            return_exceptions=True), 1.0)
+            later = await asyncio.wait_for(ev.submit(self.cases[2]), 1.0)
+            await ev.stop()
+            return results, later
+        (good, huge), later = asyncio.run(run())
+        npt.assert_allclose(good['lcoe'], self.ref['lcoe'][0], rtol=1e-14)
+        self.assertTrue(isinstance(huge, OverflowError))
+        npt.assert_allclose(later['lcoe'], self.ref['lcoe'][2], rtol=1e-14)
+
+    def testHTTP(self):
+        async def run():
+            server, ev = await service.serve()
+            port = server.sockets[0].getsockname()[1]
+            single = service.request('127.0.0.1', port, 'POST', '/lcoe', dict(self.cases[0], jacobian=True))
+            many = [service.request('127.0.0.1', port, 'POST', '/lcoe', c) for c in self.cases[1:50]]
+            listed = service.request('127.0.0.1', port, 'POST', '/lcoe', self.cases[50:60])
+            results = await asyncio.gather(single, listed, *many)
+            metrics = await service.request('127.0.0.1', port, 'GET', '/metrics')
+            bad = await service.request('127.0.0.1', port, 'POST', '/lcoe', {'machine_rating': 2000.})
+            missing = await service.request('127.0.0.1', port, 'GET', '/nothing')
+            not_objects = [await service.request('127.0.0.1', port, 'POST', '/lcoe', body) for body in [5, [1, 2], [self.cases[0], 'x']]]
+            server.close()
+            await server.wait_closed()
+            await ev.stop()
+            return results, metrics, bad, missing, not_objects
+        results, metrics, bad, missing, not_objects = asyncio.run(run())
+        (s0, single), (s1, listed) = results[:2]
+        self.assertEqual((s0, s1), (200, 200))
+        npt.assert_allclose(single['lcoe'], self.ref['lcoe'][0], rtol=1e-14)
+        self.assertTrue('machine_rating' in single['jacobian'])
+        npt.assert_allclose([r['lcoe'] for r in listed], self.ref['lcoe'][50:60], rtol=1e-14)
+        npt.assert_allclose([r[1]['lcoe'] for r in results[2:]], self.ref['lcoe'][1:50], rtol=1e-14)
+        self.assertEqual(metrics[0], 200)
+        self.assertEqual(metrics[1]['requests'], 60)
+        self.assertEqual(bad[0], 400)
+        self.assertEqual(missing[0], 404)
+        self.assertEqual([r[0] for r in not_objects], [400, 400, 400])
+
+    def testStopFailsPending(self):
+        async def run():
+            ev = service.Evaluator(max_batch=1000, max_delay=10.0)
+            jobs = [asyncio.ensure_future(ev.submit(c)) for c in self.cases[:20]]
+            await asyncio.sleep(0.05)
+            await ev.stop()
+            return await asyncio.wait_for(asyncio.gather(*jobs, return_exceptions=True), 1.0)
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestService))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
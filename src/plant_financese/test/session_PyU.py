@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+import plant_financese.cache as cache
+import plant_financese.pareto as pareto
+import plant_financese.session as session
+from plant_financese.bench import random_cases
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'sweep.journal')
+        self.cases = random_cases(500, seed=5)
+
+    def tearDown(self):
+        for s in self.opened:
+            s.close()
+        shutil.rmtree(self.tmpdir)
+
+    def open(self, **kw):
+        s = session.Session(self.path, **kw)
+        self.opened.append(s)
+        return s
+
+    def testReplay(self):
+        s = self.open()
+        ref = batch.evaluate(self.cases, intermediates=True)
+        out = s.evaluate(self.cases)
+        for k in ref:
+            npt.assert_equal(out[k], ref[k])
+        s.save_state({'step': 3})
+        s.close()
+
+        s = self.open()
+        self.assertEqual(len(s), 500)
+        self.assertEqual(s.state, {'step': 3})
+        out = s.evaluate(self.cases)
+        self.assertEqual((s.hits, s.misses), (500, 0))
+        npt.assert_equal(out['lcoe'], ref['lcoe'])
+
+    def testTornTail(self):
+        s = self.open()
+        s.evaluate(self.cases)
+        s.save_state({'step': 1})
+        s.close()
+        size = os.path.getsize(self.path)
+        s = self.open()
+        s.evaluate(random_cases(100, seed=6))
+        s.close()
+        # crash in the middle of writing the last record
+        with open(self.path, 'r+b') as f:
+            f.truncate(size + 100)
+
+        s = self.open()
+        self.assertEqual(len(s), 500)
+        self.assertEqual(s.state, {'step': 1})
+        self.assertEqual(os.path.getsize(self.path), size)
+        s.evaluate(random_cases(100, seed=6))
+        self.assertEqual(s.misses, 100)
+        s.close()
+        self.assertEqual(len(self.open()), 600)
+
+    def testCompaction(self):
+        s = self.open(compact_every=5)
+        for i in range(12):
+            s.evaluate(random_cases(10, seed=i % 4))
+            s.save_state({'step': i})
+        self.assertEqual(len(s), 40)
+        self.assertTrue(len(session.read_journal(self.path)[0]) < 5)
+        s.close()
+        s = self.open()
+        self.assertEqual((len(s), s.state), (40, {'step': 11}))
+
+    def testInvalidation(self):
+        s = self.open()
+        s.evaluate(self.cases)
+        s.save_state({'step': 1})
+        s.close()
+        s = self.open(version='changed formulation')
+        self.assertEqual((len(s), s.state), (0, None))
+
+    def testCacheWarming(self):
+        s = self.open()
+        s.evaluate(self.cases)
+        s.close()
+        with cache.EvaluationCache(os.path.join(self.tmpdir, 'finance.sqlite')) as c:
+            self.open(cache=c)
+            self.assertEqual(len(c), 500)
+            c.evaluate(self.cases)
+            self.assertEqual(c.misses, 0)
+
+    def testResumeNSGA2(self):
+        design = {'machine_rating': (1500., 5000.), 'turbine_number': (10., 150.)}
+        fixed = {'tcc_per_kW': 1093., 'bos_per_kW': 517., 'opex_per_kW': 43.56,
+                 'turbine_aep': 9915.95e3, 'wake_loss_factor': 0.15}
+        kw = dict(objectives=('lcoe', 'capital_cost', 'capacity'), population=40)
+        ref = pareto.nsga2(design, fixed, generations=10, **kw)
+
+        s = self.open()
+        pareto.nsga2(design, fixed, generations=5, session=s, **kw)
+        first = s.misses
+        s.close()
+
+        # the interrupted run continues from generation 5
+        s = self.open()
+        res = pareto.nsga2(design, fixed, generations=10, session=s, **kw)
+        self.assertEqual(s.state['nsga2']['generation'], 10)
+        self.assertTrue(s.misses <= 5 * 40)
+        self.assertTrue(first + s.misses <= 11 * 40)
+        self.assertEqual(res.evaluations, ref.evaluations)
+        npt.assert_equal(res.X, ref.X)
+        npt.assert_equal(res.F, ref.F)
+
+    def testNoResumeWithOtherSettings(self):
+        design = {'machine_rating': (1500., 5000.), 'turbine_number': (10., 150.)}
+        fixed = {'tcc_per_kW': 1093., 'bos_per_kW': 517., 'opex_per_kW': 43.56,
+                 'turbine_aep': 9915.95e3, 'wake_loss_factor': 0.15}
+        s = self.open()
+        pareto.nsga2(design, fixed, population=20, generations=2, session=s)
+        narrow = dict(design, machine_rating=(1500., 2000.))
+        changes = [dict(design=narrow), dict(fixed=dict(fixed, tcc_per_kW=1200.)),
+                   dict(constraints={'lcoe': (None, 0.06)}), dict(integer=()), dict(mutation_eta=10.)]
+        for change in changes:
+            kw = dict(design=design, fixed=fixed, population=20, generations=4)
+            kw.update(change)
+            fresh = pareto.nsga2(**kw)
+            res = pareto.nsga2(session=s, **kw)
+            # started afresh rather than continuing the saved population
+            npt.assert_equal(res.X, fresh.X, err_msg=str(change))
+            pareto.nsga2(design, fixed, population=20, generations=2, session=s)
+        res = pareto.nsga2(narrow, fixed, population=20, generations=4, session=s)
+        self.assertTrue(res.design['machine_rating'].max() <= 2000.)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestSession))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())
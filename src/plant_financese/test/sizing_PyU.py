@@ -0,0 +1,68 @@
+import numpy as np
+import numpy.testing as npt
+import unittest
+import plant_financese.batch as batch
+import plant_financese.sizing as sizing
+
+class TestSizing(unittest.TestCase):
+    def setUp(self):
+        # wake losses grow with plant size while the fixed park costs are shared by more turbines
+        self.inputs = {'machine_rating'   : np.array([2320., 3000., 4000.]),
+                       'tcc_per_kW'       : 1093.,
+                       'bos_per_kW'       : lambda n: 400. + 3000. / n,
+                       'opex_per_kW'      : 43.56,
+                       'turbine_aep'      : np.array([9915.95e3, 12.1e6, 15.3e6]),
+                       'wake_loss_factor' : lambda n: 0.05 + 0.001 * n}
+
+    def testEnumerate(self):
+        res = sizing.enumerate_turbine_number(self.inputs, 150)
+        self.assertEqual(res.lcoe.shape, (3, 150))
+        npt.assert_equal(res.counts, np.arange(1, 151))
+        for d in range(3):
+            for k in [0, 10, 149]:
+                n = k + 1
+                case = {'machine_rating': self.inputs['machine_rating'][d], 'tcc_per_kW': 1093.,
+                        'bos_per_kW': 400. + 3000. / n, 'opex_per_kW': 43.56,
+                        'turbine_aep': self.inputs['turbine_aep'][d], 'wake_loss_factor': 0.05 + 0.001 * n,
+                        'turbine_number': float(n)}
+                npt.assert_allclose(res.lcoe[d, k], batch.evaluate(case)['lcoe'][0], rtol=1e-14)
+        npt.assert_equal(res.delta, res.lcoe[:, 1:] - res.lcoe[:, :-1])
+        npt.assert_equal(res.best_lcoe, res.lcoe.min(axis=1))
+        # interior optimum: the differences change sign there
+        for d in range(3):
+            k = res.best_index[d]
+            self.assertTrue(0 < k < 149)
+            self.assertTrue(res.delta[d, k - 1] <= 0 <= res.delta[d, k])
+
+    def testRelaxedDerivative(self):
+        res = sizing.enumerate_turbine_number(self.inputs, 150)
+        # the relaxed model evaluated at non-integer counts
+        def lcoe(n):
+            case = dict(self.inputs, bos_per_kW=400. + 3000. / n, wake_loss_factor=0.05 + 0.001 * n, turbine_number=n)
+            return batch.evaluate(case, jacobian=False)['lcoe']
+        for n in [1., 11., 150.]:
+            h = 1e-4 * n
+            fd = (lcoe(n + h) - lcoe(n - h)) / (2 * h)
+            npt.assert_allclose(res.relaxed_derivative[:, int(n) - 1], fd, rtol=1e-5)
+        # it matters here: the turbine_number partial alone is zero
+        self.assertTrue(np.all(np.abs(res.relaxed_derivative[:, 10]) > 1e-6))
+
+    def testScalarDesign(self):
+        inputs = {'machine_rating': 2320., 'tcc_per_kW': 1093., 'park_aep': 5e8}
+        res = sizing.enumerate_turbine_number(inputs, 20, n_min=5)
+        self.assertEqual(res.lcoe.shape, (1, 16))
+        # with a fixed park AEP, fewer turbines is always cheaper
+        self.assertEqual(res.best_count[0], 5)
+        self.assertTrue(np.all(res.delta > 0))
+
+    def testErrors(self):
+        self.assertRaises(ValueError, sizing.enumerate_turbine_number, dict(self.inputs, turbine_number=3.), 10)
+        self.assertRaises(ValueError, sizing.enumerate_turbine_number, self.inputs, 10, 0)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestSizing))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner().run(suite())